@@ -1,22 +1,55 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile, Query, Response, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import IndexModel, ASCENDING, DESCENDING, GEOSPHERE, ReturnDocument, UpdateOne, CursorType
+from pymongo.errors import DuplicateKeyError, OperationFailure, CollectionInvalid, BulkWriteError
 import os
+import asyncio
+import multiprocessing
+import time
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError
+from typing import List, Optional, Dict
 import uuid
-from datetime import datetime, timezone, timedelta
+import re
+import math
+import html
+import bisect
+import base64
+import json
+import hashlib
+import gzip
+from email.utils import format_datetime, parsedate_to_datetime
+from collections import defaultdict, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta, date
+import zipfile
+import csv
+import codecs
+import zlib
+import numpy as np
 import jwt
 from passlib.context import CryptContext
 from reportlab.lib.pagesizes import A4
 from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
-from io import BytesIO
-from fastapi.responses import StreamingResponse
+from io import BytesIO, StringIO
+from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -27,7 +60,9 @@ client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Raising BCRYPT_ROUNDS makes existing hashes "need update"; they are rehashed on next login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 security = HTTPBearer()
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
@@ -58,6 +93,7 @@ class User(UserBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     rating: float = 0.0
     total_ratings: int = 0
+    rating_distribution: Dict[str, int] = {}  # star ("1".."5") -> count
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 class Token(BaseModel):
@@ -87,6 +123,13 @@ class Job(JobBase):
     status: str = "active"  # active, closed, completed
     posted_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     views: int = 0
+    city: Optional[str] = None  # resolved from location by the gazetteer
+    geo: Optional[Dict] = None  # GeoJSON Point [lng, lat]
+
+class JobSearchResult(Job):
+    score: Optional[float] = None
+    highlights: Optional[Dict[str, str]] = None
+    distance_km: Optional[float] = None
 
 class ApplicationBase(BaseModel):
     job_id: str
@@ -103,6 +146,35 @@ class Application(ApplicationBase):
     status: str = "pending"  # pending, accepted, rejected, completed
     applied_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+class JobSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    title: str
+    company_name: str
+    location: str
+    salary: float
+    status: str = "active"
+
+class ApplicantSummary(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    name: str
+    email: str
+    phone: Optional[str] = None
+    skills: List[str] = []
+    rating: float = 0.0
+    total_ratings: int = 0
+
+class HydratedApplication(Application):
+    job: Optional[JobSummary] = None
+    applicant: Optional[ApplicantSummary] = None
+
+class RankedApplication(Application):
+    score: Optional[float] = None
+    skill_match: Optional[float] = None
+    completed_jobs: Optional[int] = None
+    applicant: Optional[ApplicantSummary] = None
+
 class RatingBase(BaseModel):
     job_id: str
     rated_id: str  # user being rated
@@ -139,10 +211,21 @@ class ConversationBase(BaseModel):
     candidate_id: str
     employer_id: str
 
+class MessagePreview(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    sender_id: str
+    sender_name: str
+    text: str
+    created_at: str
+
 class Conversation(ConversationBase):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    last_activity_at: Optional[str] = None
+    last_message: Optional[MessagePreview] = None
+    unread: Dict[str, int] = {}  # participant user id -> unread message count
 
 class MessageBase(BaseModel):
     conversation_id: str
@@ -158,16 +241,1786 @@ class Message(MessageBase):
     sender_name: str
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+class MessageSync(BaseModel):
+    messages: List[Message]
+    sync_token: Optional[str] = None  # pass back as ?since= to fetch only newer messages
+    before_cursor: Optional[str] = None  # pass back as ?before= to fetch the previous page
+    has_more: bool = False
+
 class UpdateApplicationStatus(BaseModel):
     status: str
 
+# ==================== INDEXES & MIGRATIONS ====================
+
+# Declared indexes per collection. Reconciled on every startup: missing indexes
+# are built, indexes whose keys/options drifted are rebuilt, and indexes this
+# module created earlier but no longer declares are dropped.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="users_id", unique=True),
+        IndexModel([("email", ASCENDING)], name="users_email", unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="users_created"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="jobs_id", unique=True),
+        IndexModel([("status", ASCENDING), ("posted_date", DESCENDING), ("id", DESCENDING)], name="jobs_status_posted_date"),
+        IndexModel([("employer_id", ASCENDING), ("status", ASCENDING), ("posted_date", DESCENDING), ("id", DESCENDING)], name="jobs_employer_status"),
+        IndexModel([("geo", GEOSPHERE), ("status", ASCENDING)], name="jobs_geo"),
+        IndexModel([("posted_date", DESCENDING), ("id", DESCENDING)], name="jobs_posted_date"),
+        IndexModel([("employer_id", ASCENDING), ("posted_date", DESCENDING), ("id", DESCENDING)], name="jobs_employer_posted_date"),
+    ],
+    "applications": [
+        IndexModel([("id", ASCENDING)], name="applications_id", unique=True),
+        IndexModel([("job_id", ASCENDING), ("applicant_id", ASCENDING)], name="applications_job_applicant", unique=True),
+        IndexModel([("applicant_id", ASCENDING), ("applied_date", DESCENDING), ("id", DESCENDING)], name="applications_applicant_applied"),
+        IndexModel([("employer_id", ASCENDING), ("applied_date", DESCENDING), ("id", DESCENDING)], name="applications_employer_applied"),
+        IndexModel([("job_id", ASCENDING), ("applied_date", DESCENDING), ("id", DESCENDING)], name="applications_job_applied"),
+        IndexModel([("applied_date", DESCENDING), ("id", DESCENDING)], name="applications_applied"),
+        IndexModel([("outbox.id", ASCENDING)], name="applications_outbox", sparse=True),
+    ],
+    "ratings": [
+        IndexModel([("rated_id", ASCENDING), ("date", DESCENDING), ("id", DESCENDING)], name="ratings_rated"),
+        IndexModel([("job_id", ASCENDING), ("rater_id", ASCENDING), ("rated_id", ASCENDING)], name="ratings_job_rater_rated", unique=True),
+    ],
+    "saved_jobs": [
+        IndexModel([("user_id", ASCENDING), ("job_id", ASCENDING)], name="saved_jobs_user_job", unique=True),
+    ],
+    "conversations": [
+        IndexModel([("id", ASCENDING)], name="conversations_id", unique=True),
+        IndexModel([("job_id", ASCENDING), ("candidate_id", ASCENDING)], name="conversations_job_candidate"),
+        IndexModel([("employer_id", ASCENDING), ("last_activity_at", DESCENDING), ("id", DESCENDING)], name="conversations_employer_activity"),
+        IndexModel([("candidate_id", ASCENDING), ("last_activity_at", DESCENDING), ("id", DESCENDING)], name="conversations_candidate_activity"),
+        IndexModel([("last_activity_at", DESCENDING), ("id", DESCENDING)], name="conversations_activity"),
+    ],
+    "messages": [
+        IndexModel([("id", ASCENDING)], name="messages_id", unique=True),
+        IndexModel([("conversation_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)], name="messages_conversation_created"),
+    ],
+    "notifications": [
+        IndexModel([("id", ASCENDING)], name="notifications_id", unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="notifications_user_created"),
+        IndexModel([("user_id", ASCENDING), ("read", ASCENDING)], name="notifications_user_read"),
+    ],
+    "outbox": [
+        IndexModel([("id", ASCENDING)], name="outbox_id", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="outbox_status_available"),
+        IndexModel([("claim", ASCENDING)], name="outbox_claim"),
+    ],
+}
+
+# Which index serves each route's query shape: (route, collection, filter/sort shape,
+# index name or None where the query scans the whole collection)
+QUERY_SHAPES = [
+    ("GET /api/auth/me", "users", "{id}", "users_id"),
+    ("POST /api/auth/login", "users", "{email}", "users_email"),
+    ("POST /api/auth/register", "users", "{email}", "users_email"),
+    ("GET /api/jobs", "jobs", "{status} sort posted_date, id desc", "jobs_status_posted_date"),
+    ("GET /api/jobs?employer_id=", "jobs", "{employer_id, status} sort posted_date, id desc", "jobs_employer_status"),
+    ("GET /api/jobs?near_lat=&near_lng=", "jobs", "$geoNear geo {status}", "jobs_geo"),
+    ("GET /api/jobs/facets", "jobs", "{status} $facet", "jobs_status_posted_date"),
+    ("GET /api/jobs/facets?employer_id=", "jobs", "{employer_id, status} $facet", "jobs_employer_status"),
+    ("GET /api/jobs/recommended", "applications", "{applicant_id}", "applications_applicant_applied"),
+    ("GET /api/jobs/recommended", "jobs", "{id $in, status}", "jobs_id"),
+    ("GET /api/jobs/{job_id}", "jobs", "{id}", "jobs_id"),
+    ("PUT /api/jobs/{job_id}", "jobs", "{id}", "jobs_id"),
+    ("DELETE /api/jobs/{job_id}", "jobs", "{id}", "jobs_id"),
+    ("POST /api/applications", "applications", "{job_id, applicant_id}", "applications_job_applicant"),
+    ("GET /api/applications", "applications", "{applicant_id} sort applied_date, id desc", "applications_applicant_applied"),
+    ("GET /api/applications", "applications", "{employer_id} sort applied_date, id desc", "applications_employer_applied"),
+    ("GET /api/applications", "applications", "{} sort applied_date, id desc", "applications_applied"),
+    ("GET /api/applications/hydrated", "applications", "{employer_id} sort applied_date, id desc", "applications_employer_applied"),
+    ("GET /api/applications/hydrated", "jobs", "$lookup {id}", "jobs_id"),
+    ("GET /api/applications/hydrated", "users", "$lookup {id}", "users_id"),
+    ("GET /api/applications/job/{job_id}", "applications", "{job_id} sort applied_date, id desc", "applications_job_applied"),
+    ("GET /api/applications/job/{job_id}?ranked=true", "users", "{id $in}", "users_id"),
+    ("GET /api/applications/job/{job_id}?ranked=true", "applications", "{applicant_id $in, status} $group applicant_id", "applications_applicant_applied"),
+    ("GET /api/applications/job/{job_id}?ranked=true", "applications", "{id $in}", "applications_id"),
+    ("PUT /api/applications/{app_id}", "applications", "{id}", "applications_id"),
+    ("POST /api/ratings", "ratings", "{job_id, rater_id, rated_id}", "ratings_job_rater_rated"),
+    ("GET /api/ratings/user/{user_id}", "ratings", "{rated_id} sort date, id desc", "ratings_rated"),
+    ("GET /api/saved-jobs", "saved_jobs", "{user_id}", "saved_jobs_user_job"),
+    ("GET /api/conversations", "conversations", "{employer_id} sort last_activity_at, id desc", "conversations_employer_activity"),
+    ("GET /api/conversations", "conversations", "{candidate_id} sort last_activity_at, id desc", "conversations_candidate_activity"),
+    ("GET /api/conversations", "conversations", "{} sort last_activity_at, id desc", "conversations_activity"),
+    ("PUT /api/applications/{app_id}", "conversations", "{job_id, candidate_id}", "conversations_job_candidate"),
+    ("GET /api/conversations/{conversation_id}/messages", "conversations", "{id}", "conversations_id"),
+    ("GET /api/conversations/{conversation_id}/messages", "messages", "{conversation_id} sort created_at, id", "messages_conversation_created"),
+    ("GET /api/conversations/{conversation_id}/sync", "messages", "{conversation_id} created_at, id range", "messages_conversation_created"),
+    ("GET /api/notifications", "notifications", "{user_id} sort created_at desc", "notifications_user_created"),
+    ("PUT /api/notifications/{notif_id}/read", "notifications", "{id, user_id}", "notifications_id"),
+    ("GET /api/notifications/stream", "notifications", "{user_id, read} count", "notifications_user_read"),
+    ("GET /api/notifications/stream", "notifications", "{user_id} created_at, id > Last-Event-ID", "notifications_user_created"),
+    ("GET /api/admin/stats", "users", "$group role (collection scan)", None),
+    ("outbox worker", "outbox", "{status, available_at}", "outbox_status_available"),
+    ("outbox worker", "outbox", "{claim}", "outbox_claim"),
+    ("outbox worker", "outbox", "{id $in}", "outbox_id"),
+    ("outbox worker", "applications", "{outbox.id exists}", "applications_outbox"),
+    ("GET /api/admin/users", "users", "{} sort created_at, id desc", "users_created"),
+    ("GET /api/reports/export/jobs", "jobs", "{posted_date range} sort posted_date, id", "jobs_posted_date"),
+    ("GET /api/reports/export/jobs", "jobs", "{employer_id, posted_date range} sort posted_date, id", "jobs_employer_posted_date"),
+    ("GET /api/reports/export/applications", "applications", "{applied_date range} sort applied_date, id", "applications_applied"),
+    ("GET /api/reports/export/applications", "applications", "{employer_id, applied_date range} sort applied_date, id", "applications_employer_applied"),
+    ("GET /api/reports/export/users", "users", "{created_at range} sort created_at, id", "users_created"),
+    ("GET /api/reports/stats", "jobs", "{employer_id} $group status", "jobs_employer_status"),
+    ("GET /api/reports/stats", "applications", "{employer_id} $group status", "applications_employer_applied"),
+    ("GET /api/reports/stats", "applications", "{applicant_id} $facet status/earnings", "applications_applicant_applied"),
+]
+
+MIGRATION_LOCK_TTL = timedelta(minutes=5)
+MIGRATION_STATE_ID = "state"
+MIGRATION_LOCK_ID = "lock"
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+async def acquire_migration_lock():
+    now = datetime.now(timezone.utc)
+    try:
+        lock = await db.schema_migrations.find_one_and_update(
+            {"_id": MIGRATION_LOCK_ID, "$or": [{"locked_until": {"$lt": now}}, {"owner": WORKER_ID}]},
+            {"$set": {"owner": WORKER_ID, "locked_until": now + MIGRATION_LOCK_TTL}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lock
+        return False
+    return lock is not None and lock["owner"] == WORKER_ID
+
+async def release_migration_lock():
+    await db.schema_migrations.delete_one({"_id": MIGRATION_LOCK_ID, "owner": WORKER_ID})
+
+class MigrationLockLost(Exception):
+    pass
+
+async def renew_migration_lock():
+    result = await db.schema_migrations.update_one(
+        {"_id": MIGRATION_LOCK_ID, "owner": WORKER_ID},
+        {"$set": {"locked_until": datetime.now(timezone.utc) + MIGRATION_LOCK_TTL}}
+    )
+    return result.matched_count == 1
+
+async def ensure_migration_lock():
+    # Checked before every index change and migration, so a worker whose lease
+    # lapsed (e.g. its event loop stalled past the TTL) stops instead of racing the new owner
+    if not await renew_migration_lock():
+        raise MigrationLockLost(f"Worker {WORKER_ID} no longer holds the migration lock")
+
+async def keep_migration_lock():
+    # One index build or backfill can outlast MIGRATION_LOCK_TTL, so the lease is
+    # renewed in the background for as long as migrations run
+    while True:
+        await asyncio.sleep(MIGRATION_LOCK_TTL.total_seconds() / 3)
+        try:
+            if not await renew_migration_lock():
+                logger.error(f"Worker {WORKER_ID} lost the migration lock")
+                return
+        except Exception as e:
+            logger.error(f"Migration lock renewal failed: {e}")
+
+def normalize_index_key(key):
+    return [(field, direction if isinstance(direction, str) else int(direction)) for field, direction in key]
+
+def index_matches(existing: dict, model: IndexModel):
+    spec = model.document
+    return (
+        normalize_index_key(existing["key"]) == normalize_index_key(spec["key"].items())
+        and bool(existing.get("unique", False)) == bool(spec.get("unique", False))
+        and existing.get("sparse", False) == spec.get("sparse", False)
+    )
+
+async def reconcile_indexes(previously_managed: List[str]):
+    report = {"created": [], "rebuilt": [], "dropped": [], "failed": []}
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        declared = {m.document["name"] for m in models}
+
+        for name in previously_managed:
+            coll, _, index_name = name.partition(".")
+            if coll == collection_name and index_name in existing and index_name not in declared:
+                await ensure_migration_lock()
+                await collection.drop_index(index_name)
+                report["dropped"].append(name)
+
+        for model in models:
+            name = model.document["name"]
+            if name in existing:
+                if index_matches(existing[name], model):
+                    continue
+                await ensure_migration_lock()
+                await collection.drop_index(name)
+                action = "rebuilt"
+            else:
+                await ensure_migration_lock()
+                action = "created"
+            try:
+                await collection.create_indexes([model])
+                report[action].append(f"{collection_name}.{name}")
+            except OperationFailure as e:
+                # e.g. duplicate data blocking a unique index; keep serving and surface it in the report
+                logger.error(f"Index {collection_name}.{name} could not be built: {e}")
+                report["failed"].append(f"{collection_name}.{name}")
+    return report
+
+async def apply_migrations():
+    state = await db.schema_migrations.find_one({"_id": MIGRATION_STATE_ID}) or {}
+    index_report = await reconcile_indexes(state.get("managed_indexes", []))
+
+    version = state.get("version", 0)
+    for migration_version, description, migration in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        await ensure_migration_lock()
+        logger.info(f"Applying migration {migration_version}: {description}")
+        await migration()
+        version = migration_version
+        await db.schema_migrations.update_one(
+            {"_id": MIGRATION_STATE_ID},
+            {"$set": {"version": version}},
+            upsert=True
+        )
+
+    managed = [f"{c}.{m.document['name']}" for c, models in INDEXES.items() for m in models]
+    await db.schema_migrations.update_one(
+        {"_id": MIGRATION_STATE_ID},
+        {"$set": {
+            "version": version,
+            "managed_indexes": managed,
+            "last_run": datetime.now(timezone.utc).isoformat(),
+            "last_report": index_report
+        }},
+        upsert=True
+    )
+    logger.info(f"Schema at version {version}; indexes {index_report}")
+
+async def run_migrations():
+    # Only one worker runs migrations; the rest wait until the lock is released.
+    # A worker that loses the lock mid-run goes back to waiting, and whoever holds
+    # it next resumes from the last recorded version.
+    while True:
+        while not await acquire_migration_lock():
+            await asyncio.sleep(1)
+        heartbeat = asyncio.create_task(keep_migration_lock())
+        try:
+            await apply_migrations()
+            return
+        except MigrationLockLost as e:
+            logger.error(f"{e}; waiting to retry")
+        finally:
+            heartbeat.cancel()
+            await release_migration_lock()
+
+async def get_index_report():
+    state = await db.schema_migrations.find_one({"_id": MIGRATION_STATE_ID}, {"_id": 0}) or {}
+    present = {}
+    for collection_name in INDEXES:
+        present[collection_name] = list((await db[collection_name].index_information()).keys())
+    routes = [
+        {
+            "route": route,
+            "collection": collection_name,
+            "query_shape": shape,
+            "index": index_name,
+            "present": index_name in present.get(collection_name, []) if index_name else None
+        }
+        for route, collection_name, shape, index_name in QUERY_SHAPES
+    ]
+    return {
+        "schema_version": state.get("version", 0),
+        "latest_version": MIGRATIONS[-1][0] if MIGRATIONS else 0,
+        "last_run": state.get("last_run"),
+        "last_report": state.get("last_report"),
+        "indexes": present,
+        "routes": routes
+    }
+
+# ==================== CACHING & METRICS ====================
+
+class LatencyStats:
+    """Call count and latency summary over a sliding window of recent samples."""
+
+    def __init__(self, window: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def stats(self) -> dict:
+        ordered = sorted(self.samples)
+        def percentile(p):
+            return round(ordered[min(int(p * len(ordered)), len(ordered) - 1)] * 1000, 3) if ordered else 0.0
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(self.max * 1000, 3)
+        }
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after a fixed TTL."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        self.entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop(self, key):
+        return self.entries.pop(key, None)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+class ByteLRUCache:
+    """LRU cache bounded by the total byte size of its entries, with an optional TTL."""
+
+    def __init__(self, max_bytes: int, ttl: Optional[float] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (size, expires_at, value)
+        self.expiry = deque()  # (expires_at, key) in insertion order, which is expiry order with one TTL
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] < time.monotonic():
+            # An expired entry is dropped and counted as a miss
+            self.pop(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key, value, size: int):
+        self.purge_expired()
+        if size > self.max_bytes:
+            return
+        self.pop(key)
+        expires_at = None
+        if self.ttl is not None:
+            expires_at = time.monotonic() + self.ttl
+            self.expiry.append((expires_at, key))
+        self.entries[key] = (size, expires_at, value)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (evicted_size, _, _) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    def purge_expired(self):
+        # Frees the byte budget held by expired entries that were never looked up again
+        now = time.monotonic()
+        while self.expiry and self.expiry[0][0] < now:
+            expires_at, key = self.expiry.popleft()
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == expires_at:
+                self.pop(key)
+                self.expirations += 1
+        if not self.entries:
+            self.expiry.clear()
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry[0]
+        return entry[2]
+
+    def clear(self):
+        self.entries.clear()
+        self.expiry.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        self.purge_expired()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+def weak_etag(etag: str) -> str:
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison, as If-None-Match requires: compressed responses carry the W/ form of the tag
+        tags = [weak_etag(tag.strip()) for tag in if_none_match.split(",")]
+        return weak_etag(etag) in tags or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+# ==================== SERIALIZATION ====================
+
+# Documents we read with model_projection (or build from our own models) are
+# already in response shape, so hot endpoints return them through
+# json_response and skip FastAPI's second response_model validation pass.
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+def dump_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+def json_response(content, response: Optional[Response] = None) -> FastJSONResponse:
+    # Carries over headers (e.g. the next cursor) set on the injected Response
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    return FastJSONResponse(content, headers=headers)
+
+def model_projection(model, exclude=()) -> dict:
+    projection = {field: 1 for field in model.model_fields if field not in exclude}
+    projection["_id"] = 0
+    return projection
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+class CompressionMiddleware:
+    """Compresses single-message responses with brotli or gzip; streamed bodies (SSE, ZIP) pass through.
+
+    A strong ETag names one exact byte sequence, so the ETag of a compressed body
+    is weakened (W/) and a 304 answering a weak If-None-Match repeats that form.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start_message = None
+        
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] == "http.response.body" and start_message is not None:
+                start, start_message = start_message, None
+                headers = MutableHeaders(raw=start["headers"])
+                body = message.get("body", b"")
+                if (
+                    not message.get("more_body", False)
+                    and len(body) >= self.minimum_size
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+                ):
+                    body = brotli.compress(body, quality=4) if encoding == "br" else gzip.compress(body, compresslevel=6)
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    if "etag" in headers:
+                        headers["ETag"] = weak_etag(headers["etag"])
+                    message = {**message, "body": body}
+                elif start["status"] == 304 and "etag" in headers:
+                    weak = weak_etag(headers["etag"])
+                    if weak in [tag.strip() for tag in request_headers.get("if-none-match", "").split(",")]:
+                        headers["ETag"] = weak
+                await send(start)
+            await send(message)
+        
+        await self.app(scope, receive, send_compressed)
+
+# ==================== PAGINATION ====================
+
+# List endpoints return one page per request. The opaque cursor for the next
+# page is sent in the X-Next-Cursor header so the body stays a plain list.
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', '500'))
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def page_limit(limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
+    return limit
+
+def keyset_query(query: dict, sort_field: str, direction: int, cursor: Optional[str]) -> dict:
+    if not cursor:
+        return query
+    last_value, last_id = decode_cursor(cursor, 2)
+    op = "$lt" if direction == DESCENDING else "$gt"
+    keyset = {"$or": [
+        {sort_field: {op: last_value}},
+        {sort_field: last_value, "id": {op: last_id}}
+    ]}
+    return {"$and": [query, keyset]} if query else keyset
+
+def set_next_cursor(docs: list, limit: int, sort_field: str, response: Response) -> list:
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1].get(sort_field), docs[-1]["id"])
+    return docs
+
+async def paginate(
+    collection,
+    query: dict,
+    sort_field: str,
+    direction: int,
+    limit: int,
+    cursor: Optional[str],
+    response: Response,
+    projection: Optional[dict] = None
+) -> list:
+    # Keyset pagination on (sort_field, id): every page is a bounded index range scan
+    query = keyset_query(query, sort_field, direction, cursor)
+    docs = await collection.find(query, projection or {"_id": 0}).sort(
+        [(sort_field, direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    return set_next_cursor(docs, limit, sort_field, response)
+
+# ==================== JOB SEARCH ====================
+
+ARABIC_DIACRITICS = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED\u0640]")
+ARABIC_CHAR_MAP = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه",
+    "٠": "0", "١": "1", "٢": "2", "٣": "3", "٤": "4",
+    "٥": "5", "٦": "6", "٧": "7", "٨": "8", "٩": "9",
+})
+# One-letter proclitics (و ب ف ك ل) are only stripped together with the article:
+# on their own they are as often the first letter of the word (كاشير, وظيفة)
+ARABIC_PREFIXES = ("وال", "بال", "كال", "فال", "لل", "ال")
+ARABIC_SUFFIXES = ("ات", "ون", "ين", "ان", "ها", "ه", "ي")
+TOKEN_PATTERN = re.compile(r"\w+")
+SEARCH_FIELD_WEIGHTS = {"title": 3.0, "company_name": 2.0, "description": 1.0}
+# Equality filters applied inside the index, so ranking and any result cap only
+# ever see jobs the listing could return (closed jobs never crowd out active ones)
+SEARCH_FILTER_FIELDS = ("status", "employer_id", "category", "duration_type")
+SEARCH_MAX_RESULTS = 1000
+SEARCH_SNIPPET_CHARS = 160
+SEARCH_REFRESH_SECONDS = int(os.environ.get('SEARCH_REFRESH_SECONDS', '300'))
+
+def normalize_arabic(text: str) -> str:
+    return ARABIC_DIACRITICS.sub("", text).translate(ARABIC_CHAR_MAP).lower()
+
+def stem_token(token: str) -> str:
+    # Light stemming: strip at most one prefix and one suffix while keeping a 2-letter root
+    for prefix in ARABIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+            token = token[len(prefix):]
+            break
+    for suffix in ARABIC_SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            break
+    return token
+
+def analyze(text: str) -> List[str]:
+    return [stem_token(t) for t in TOKEN_PATTERN.findall(normalize_arabic(text or ""))]
+
+class JobSearchIndex:
+    """In-memory inverted index over job title, company name and description."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)  # term -> {job_id: weighted term frequency}
+        self.doc_terms = {}  # job_id -> set of terms, used to unindex on update/delete
+        self.doc_lengths = {}
+        self.doc_fields = {}  # job_id -> values of SEARCH_FILTER_FIELDS
+        self.vocabulary = []  # sorted terms for prefix expansion of the last query token
+
+    def add(self, job: dict):
+        job_id = job["id"]
+        self.remove(job_id)
+        weights = defaultdict(float)
+        length = 0
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            terms = analyze(job.get(field, ""))
+            length += len(terms)
+            for term in terms:
+                weights[term] += weight
+        for term, weight in weights.items():
+            if term not in self.postings:
+                bisect.insort(self.vocabulary, term)
+            self.postings[term][job_id] = weight
+        self.doc_terms[job_id] = set(weights)
+        self.doc_lengths[job_id] = max(length, 1)
+        self.doc_fields[job_id] = {field: job.get(field) for field in SEARCH_FILTER_FIELDS}
+
+    def remove(self, job_id: str):
+        for term in self.doc_terms.pop(job_id, ()):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(job_id, None)
+            if not postings:
+                del self.postings[term]
+                index = bisect.bisect_left(self.vocabulary, term)
+                if index < len(self.vocabulary) and self.vocabulary[index] == term:
+                    self.vocabulary.pop(index)
+        self.doc_lengths.pop(job_id, None)
+        self.doc_fields.pop(job_id, None)
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_terms.clear()
+        self.doc_lengths.clear()
+        self.doc_fields.clear()
+        self.vocabulary.clear()
+
+    def expand_prefix(self, prefix: str, limit: int = 50) -> List[str]:
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        terms = []
+        for term in self.vocabulary[start:start + limit]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: Optional[int] = SEARCH_MAX_RESULTS, filters: Optional[dict] = None) -> List[tuple]:
+        # filters: {field: value} over SEARCH_FILTER_FIELDS; limit=None returns every hit
+        terms = analyze(query)
+        if not terms:
+            return []
+        total_docs = max(len(self.doc_lengths), 1)
+        avg_length = sum(self.doc_lengths.values()) / total_docs if self.doc_lengths else 1
+        scores = defaultdict(float)
+        matched = defaultdict(int)
+        for position, term in enumerate(terms):
+            candidates = [term]
+            if position == len(terms) - 1:
+                # The last token may still be being typed
+                candidates = self.expand_prefix(term) or candidates
+            seen = set()
+            for candidate in candidates:
+                postings = self.postings.get(candidate, {})
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for job_id, tf in postings.items():
+                    # BM25 with k1=1.2, b=0.75
+                    norm = tf * 2.2 / (tf + 1.2 * (0.25 + 0.75 * self.doc_lengths[job_id] / avg_length))
+                    scores[job_id] += idf * norm * (1.0 if candidate == term else 0.5)
+                    seen.add(job_id)
+            for job_id in seen:
+                matched[job_id] += 1
+        # Every query term must match (AND semantics), as the regex search required the whole phrase
+        ranked = [
+            (job_id, score) for job_id, score in scores.items()
+            if matched[job_id] == len(terms) and self.matches(job_id, filters)
+        ]
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked if limit is None else ranked[:limit]
+
+    def matches(self, job_id: str, filters: Optional[dict]) -> bool:
+        if not filters:
+            return True
+        fields = self.doc_fields[job_id]
+        return all(fields.get(field) == value for field, value in filters.items())
+
+def highlight(text: str, query: str, snippet: bool = False) -> Optional[str]:
+    if not text:
+        return None
+    terms = analyze(query)
+    last = terms[-1] if terms else ""
+    spans = []
+    for match in TOKEN_PATTERN.finditer(text):
+        stem = stem_token(normalize_arabic(match.group()))
+        if stem in terms or (last and stem.startswith(last)):
+            spans.append(match.span())
+    if not spans:
+        return None
+    start, end = 0, len(text)
+    if snippet and len(text) > SEARCH_SNIPPET_CHARS:
+        start = max(spans[0][0] - SEARCH_SNIPPET_CHARS // 4, 0)
+        end = min(start + SEARCH_SNIPPET_CHARS, len(text))
+        spans = [span for span in spans if span[0] >= start and span[1] <= end]
+    parts = ["…" if start > 0 else ""]
+    cursor = start
+    for span_start, span_end in spans:
+        parts.append(html.escape(text[cursor:span_start]))
+        parts.append(f"<mark>{html.escape(text[span_start:span_end])}</mark>")
+        cursor = span_end
+    parts.append(html.escape(text[cursor:end]))
+    parts.append("…" if end < len(text) else "")
+    return "".join(parts)
+
+def highlight_job(job: dict, query: str) -> Dict[str, str]:
+    highlights = {}
+    for field in SEARCH_FIELD_WEIGHTS:
+        fragment = highlight(job.get(field, ""), query, snippet=(field == "description"))
+        if fragment:
+            highlights[field] = fragment
+    return highlights
+
+job_search_index = JobSearchIndex()
+
+# The search index and the recommender are rebuilt by scanning the catalog
+# across many awaits and then swapping in a fresh copy. Writes this worker makes
+# meanwhile are journalled and replayed onto the fresh copy right before the
+# swap, otherwise they would be lost with the old one.
+job_index_journals = []
+
+def index_job(job: dict):
+    job_search_index.add(job)
+    job_recommender.upsert(job)
+    for journal in job_index_journals:
+        journal.append((job["id"], job))
+
+def unindex_job(job_id: str):
+    job_search_index.remove(job_id)
+    job_recommender.remove(job_id)
+    for journal in job_index_journals:
+        journal.append((job_id, None))
+
+async def scan_jobs(query: dict, projection: dict, add, remove):
+    # Feeds every matching job to add, then replays the writes made during the scan
+    journal = []
+    job_index_journals.append(journal)
+    try:
+        async for job in db.jobs.find(query, projection):
+            add(job)
+    finally:
+        job_index_journals.remove(journal)
+    for job_id, job in journal:
+        if job is None:
+            remove(job_id)
+        else:
+            add(job)
+
+def search_filters(query: dict) -> dict:
+    # The plain equality conditions of a listing query that the index can apply itself
+    return {field: query[field] for field in SEARCH_FILTER_FIELDS if isinstance(query.get(field), str)}
+
+async def search_jobs(query: dict, search: str, cursor: Optional[str], limit: int, response: Response) -> list:
+    # Walk the ranked hits in (score desc, id) order, letting MongoDB apply the
+    # remaining filters chunk by chunk until the page is full
+    hits = job_search_index.search(search, limit=None, filters=search_filters(query))
+    hits.sort(key=lambda hit: (-hit[1], hit[0]))
+    if cursor:
+        last_score, last_id = decode_cursor(cursor, 2)
+        hits = [hit for hit in hits if (-hit[1], hit[0]) > (-last_score, last_id)]
+    page = []
+    position = 0
+    while position < len(hits) and len(page) <= limit:
+        chunk = hits[position:position + limit + 1]
+        position += len(chunk)
+        found = {
+            job["id"]: job
+            for job in await db.jobs.find({**query, "id": {"$in": [job_id for job_id, _ in chunk]}}, model_projection(Job)).to_list(len(chunk))
+        }
+        for job_id, score in chunk:
+            if job_id in found:
+                job = found[job_id]
+                job["score"] = score
+                page.append(job)
+    if len(page) > limit:
+        page = page[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(page[-1]["score"], page[-1]["id"])
+    for job in page:
+        job["highlights"] = highlight_job(job, search)
+    return page
+
+async def rebuild_search_index():
+    projection = {"_id": 0, "id": 1, **{field: 1 for field in [*SEARCH_FIELD_WEIGHTS, *SEARCH_FILTER_FIELDS]}}
+    fresh = JobSearchIndex()
+    await scan_jobs({}, projection, fresh.add, fresh.remove)
+    # Nothing is awaited between the replay and the swap
+    global job_search_index
+    job_search_index = fresh
+    logger.info(f"Search index built with {len(fresh.doc_lengths)} jobs and {len(fresh.postings)} terms")
+
+async def refresh_job_indexes_periodically():
+    # Writes handled by other workers only reach this process's indexes through a periodic rebuild
+    while True:
+        await asyncio.sleep(SEARCH_REFRESH_SECONDS)
+        try:
+            await rebuild_search_index()
+            await rebuild_recommender()
+        except Exception as e:
+            logger.error(f"Job index refresh failed: {e}")
+
+# ==================== RECOMMENDATIONS ====================
+
+# Active jobs are held as rows of a NumPy matrix of hashed unigram/bigram
+# features (requirements weighted above the title), L2-normalized. A seeker's
+# skills become one IDF-weighted query vector and every job is scored with a
+# single matrix-vector product.
+RECOMMENDER_DIMENSIONS = int(os.environ.get('RECOMMENDER_DIMENSIONS', '2048'))
+RECOMMENDER_FIELD_WEIGHTS = {"requirements": 1.0, "title": 0.5}
+
+def hashed_features(text: str, dims: int) -> Dict[int, float]:
+    tokens = analyze(text)
+    features = defaultdict(float)
+    for gram in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        features[zlib.crc32(gram.encode()) % dims] += 1.0
+    return features
+
+class JobRecommender:
+    def __init__(self, dims: int = RECOMMENDER_DIMENSIONS, capacity: int = 1024):
+        self.dims = dims
+        self.matrix = np.zeros((capacity, dims), dtype=np.float32)
+        self.df = np.zeros(dims, dtype=np.float32)  # active jobs containing each feature
+        self.job_ids = []  # row -> job id
+        self.rows = {}  # job id -> row
+
+    def vectorize(self, job: dict) -> np.ndarray:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        texts = {"requirements": " ".join(job.get("requirements") or []), "title": job.get("title", "")}
+        for field, weight in RECOMMENDER_FIELD_WEIGHTS.items():
+            for index, count in hashed_features(texts[field], self.dims).items():
+                vector[index] += weight * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def upsert(self, job: dict):
+        if job.get("status", "active") != "active":
+            self.remove(job["id"])
+            return
+        vector = self.vectorize(job)
+        row = self.rows.get(job["id"])
+        if row is None:
+            row = len(self.job_ids)
+            if row == self.matrix.shape[0]:
+                self.matrix = np.vstack([self.matrix, np.zeros_like(self.matrix)])
+            self.job_ids.append(job["id"])
+            self.rows[job["id"]] = row
+        else:
+            self.df -= self.matrix[row] > 0
+        self.matrix[row] = vector
+        self.df += vector > 0
+
+    def remove(self, job_id: str):
+        row = self.rows.pop(job_id, None)
+        if row is None:
+            return
+        self.df -= self.matrix[row] > 0
+        # Keep rows dense: move the last row into the freed slot
+        last = len(self.job_ids) - 1
+        if row != last:
+            self.matrix[row] = self.matrix[last]
+            moved = self.job_ids[last]
+            self.job_ids[row] = moved
+            self.rows[moved] = row
+        self.matrix[last] = 0
+        self.job_ids.pop()
+
+    def top_k(self, skills: List[str], k: int, exclude: set) -> List[tuple]:
+        size = len(self.job_ids)
+        if not size or not skills:
+            return []
+        query = np.zeros(self.dims, dtype=np.float32)
+        for index, count in hashed_features(" ".join(skills), self.dims).items():
+            query[index] = 1.0 + math.log(count)
+        query *= np.log((1 + size) / (1 + self.df)) + 1.0
+        norm = np.linalg.norm(query)
+        if not norm:
+            return []
+        scores = self.matrix[:size] @ (query / norm)
+        wanted = min(k + len(exclude), size)
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for row in top:
+            if scores[row] <= 0:
+                break
+            job_id = self.job_ids[row]
+            if job_id not in exclude:
+                results.append((job_id, float(scores[row])))
+                if len(results) == k:
+                    break
+        return results
+
+job_recommender = JobRecommender()
+
+async def rebuild_recommender():
+    projection = {"_id": 0, "id": 1, "title": 1, "requirements": 1, "status": 1}
+    fresh = JobRecommender()
+    # upsert drops replayed jobs that are no longer active
+    await scan_jobs({"status": "active"}, projection, fresh.upsert, fresh.remove)
+    global job_recommender
+    job_recommender = fresh
+    logger.info(f"Recommender built with {len(fresh.job_ids)} active jobs")
+
+# ==================== APPLICANT RANKING ====================
+
+# All applicants to a job are scored in one pass: requirements and skills are
+# hashed into binary feature matrices so every applicant's requirement coverage
+# comes from one matrix product, blended with a smoothed rating and completed
+# job history. Rankings are cached per job until a new application arrives.
+APPLICANT_RANKING_WEIGHTS = {"skills": 0.6, "rating": 0.25, "experience": 0.15}
+APPLICANT_RANKING_TTL = float(os.environ.get('APPLICANT_RANKING_TTL', '300'))
+RATING_PRIOR_MEAN = 3.0  # a user with few ratings is pulled toward this...
+RATING_PRIOR_COUNT = 3  # ...as if they had this many extra ratings of it
+EXPERIENCE_SCALE = 5.0  # completed jobs at which experience reaches ~63%
+applicant_ranking_cache = TTLCache(1000, APPLICANT_RANKING_TTL)  # job id -> ranked entries
+
+def feature_matrix(texts: List[str], dims: int) -> np.ndarray:
+    matrix = np.zeros((len(texts), dims), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row, list(hashed_features(text, dims))] = 1.0
+    return matrix
+
+def score_applicants(requirements: List[str], applicants: List[dict], completed: List[int]) -> Dict[str, np.ndarray]:
+    if requirements:
+        required = feature_matrix(requirements, RECOMMENDER_DIMENSIONS)
+        skills = feature_matrix([" ".join(a.get("skills") or []) for a in applicants], RECOMMENDER_DIMENSIONS)
+        # Share of each requirement's features found in the applicant's skills, averaged over requirements
+        coverage = (skills @ required.T) / np.maximum(required.sum(axis=1), 1.0)
+        skill_match = coverage.mean(axis=1)
+    else:
+        skill_match = np.zeros(len(applicants), dtype=np.float32)
+    ratings = np.array([a.get("rating", 0.0) for a in applicants], dtype=np.float32)
+    counts = np.array([a.get("total_ratings", 0) for a in applicants], dtype=np.float32)
+    rating = (ratings * counts + RATING_PRIOR_MEAN * RATING_PRIOR_COUNT) / (counts + RATING_PRIOR_COUNT) / 5.0
+    experience = 1.0 - np.exp(-np.array(completed, dtype=np.float32) / EXPERIENCE_SCALE)
+    score = (
+        APPLICANT_RANKING_WEIGHTS["skills"] * skill_match
+        + APPLICANT_RANKING_WEIGHTS["rating"] * rating
+        + APPLICANT_RANKING_WEIGHTS["experience"] * experience
+    )
+    return {"score": score, "skill_match": skill_match}
+
+async def rank_applicants(job: dict) -> List[dict]:
+    # Oldest first so that ties keep application order under the stable sort
+    applications = await db.applications.find(
+        {"job_id": job["id"]}, {"_id": 0, "id": 1, "applicant_id": 1}
+    ).sort([("applied_date", ASCENDING), ("id", ASCENDING)]).to_list(None)
+    if not applications:
+        return []
+    
+    applicant_ids = [a["applicant_id"] for a in applications]
+    users, completed = await asyncio.gather(
+        db.users.find({"id": {"$in": applicant_ids}}, model_projection(ApplicantSummary)).to_list(None),
+        count_by(db.applications, "applicant_id", {"applicant_id": {"$in": applicant_ids}, "status": "completed"})
+    )
+    users_by_id = {user["id"]: user for user in users}
+    applicants = [users_by_id.get(applicant_id, {}) for applicant_id in applicant_ids]
+    history = [completed.get(applicant_id, 0) for applicant_id in applicant_ids]
+    scores = score_applicants(job.get("requirements") or [], applicants, history)
+    
+    return [
+        {
+            "id": applications[row]["id"],
+            "score": round(float(scores["score"][row]), 4),
+            "skill_match": round(float(scores["skill_match"][row]), 4),
+            "completed_jobs": history[row],
+            "applicant": users_by_id.get(applicant_ids[row])
+        }
+        for row in np.argsort(-scores["score"], kind="stable")
+    ]
+
+# ==================== GEOCODING ====================
+
+# Offline gazetteer: canonical city -> ((lng, lat), aliases). Aliases are
+# matched after the same normalization and stemming used by search, so
+# "بالرياض" and "الرياض" both resolve to Riyadh.
+CITY_GAZETTEER = {
+    "الرياض": ((46.6753, 24.7136), ["الرياض", "riyadh"]),
+    "جدة": ((39.1925, 21.4858), ["جدة", "jeddah", "jiddah"]),
+    "مكة المكرمة": ((39.8579, 21.3891), ["مكة", "مكة المكرمة", "makkah", "mecca"]),
+    "المدينة المنورة": ((39.5692, 24.5247), ["المدينة المنورة", "madinah", "medina"]),
+    "الدمام": ((50.0888, 26.4207), ["الدمام", "dammam"]),
+    "الخبر": ((50.1971, 26.2172), ["الخبر", "khobar", "al khobar"]),
+    "الظهران": ((50.0393, 26.2361), ["الظهران", "dhahran"]),
+    "الأحساء": ((49.5856, 25.3647), ["الأحساء", "الاحساء", "الهفوف", "al ahsa", "hofuf"]),
+    "القطيف": ((50.0115, 26.5196), ["القطيف", "qatif"]),
+    "الجبيل": ((49.6460, 27.0046), ["الجبيل", "jubail"]),
+    "الطائف": ((40.4158, 21.2703), ["الطائف", "taif"]),
+    "تبوك": ((36.5662, 28.3835), ["تبوك", "tabuk"]),
+    "بريدة": ((43.9818, 26.3592), ["بريدة", "buraidah", "buraydah"]),
+    "عنيزة": ((43.9935, 26.0843), ["عنيزة", "unaizah"]),
+    "حائل": ((41.7208, 27.5114), ["حائل", "hail", "ha'il"]),
+    "أبها": ((42.5053, 18.2164), ["أبها", "abha"]),
+    "خميس مشيط": ((42.7333, 18.3000), ["خميس مشيط", "khamis mushait"]),
+    "جازان": ((42.5511, 16.8892), ["جازان", "جيزان", "jazan", "jizan"]),
+    "نجران": ((44.1277, 17.4924), ["نجران", "najran"]),
+    "الباحة": ((41.4677, 20.0129), ["الباحة", "al baha", "al bahah"]),
+    "ينبع": ((38.0618, 24.0895), ["ينبع", "yanbu"]),
+    "الخرج": ((47.3346, 24.1556), ["الخرج", "al kharj"]),
+    "حفر الباطن": ((45.9708, 28.4328), ["حفر الباطن", "hafar al batin"]),
+    "عرعر": ((41.0381, 30.9753), ["عرعر", "arar"]),
+    "سكاكا": ((40.2064, 29.9697), ["سكاكا", "sakaka"]),
+    "القنفذة": ((41.0789, 19.1264), ["القنفذة", "qunfudhah"]),
+    "رابغ": ((39.0349, 22.7986), ["رابغ", "rabigh"]),
+    "العلا": ((37.9232, 26.6085), ["العلا", "alula", "al ula"]),
+}
+EARTH_RADIUS_KM = 6378.1
+DEFAULT_RADIUS_KM = 25.0
+
+def build_alias_index() -> List[tuple]:
+    aliases = []
+    for city, (_, names) in CITY_GAZETTEER.items():
+        for name in names:
+            aliases.append((" ".join(analyze(name)), city))
+    # Longest alias first so "المدينة المنورة" wins over shorter overlaps
+    aliases.sort(key=lambda item: len(item[0]), reverse=True)
+    return aliases
+
+CITY_ALIASES = build_alias_index()
+
+def geocode_location(location: str) -> tuple:
+    # Returns (city, GeoJSON point) or (None, None) when no known city is mentioned
+    text = f" {' '.join(analyze(location))} "
+    for alias, city in CITY_ALIASES:
+        if f" {alias} " in text:
+            lng, lat = CITY_GAZETTEER[city][0]
+            return city, {"type": "Point", "coordinates": [lng, lat]}
+    return None, None
+
+def parse_bbox(bbox: str) -> List[float]:
+    try:
+        min_lng, min_lat, max_lng, max_lat = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="bbox must be min_lng,min_lat,max_lng,max_lat")
+    if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+        raise HTTPException(status_code=400, detail="Invalid bbox")
+    return [min_lng, min_lat, max_lng, max_lat]
+
+def geo_filter(near: Optional[List[float]], radius_km: float, bbox: Optional[List[float]]) -> dict:
+    if bbox:
+        min_lng, min_lat, max_lng, max_lat = bbox
+        ring = [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+        return {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": [ring]}}}
+    return {"$geoWithin": {"$centerSphere": [near, radius_km / EARTH_RADIUS_KM]}}
+
+async def geo_search_jobs(query: dict, near: List[float], max_distance_km: Optional[float], cursor: Optional[str], limit: int, response: Response) -> list:
+    # Distance-ordered pages; the cursor is (distance, id) resumed through minDistance
+    geo_near = {
+        "near": {"type": "Point", "coordinates": near},
+        "key": "geo",
+        "distanceField": "distance_m",
+        "query": query,
+        "spherical": True
+    }
+    if max_distance_km is not None:
+        geo_near["maxDistance"] = max_distance_km * 1000
+    pipeline = [{"$geoNear": geo_near}]
+    if cursor:
+        last_distance, last_id = decode_cursor(cursor, 2)
+        geo_near["minDistance"] = last_distance
+        pipeline.append({"$match": {"$or": [{"distance_m": {"$gt": last_distance}}, {"id": {"$gt": last_id}}]}})
+    pipeline.append({"$sort": {"distance_m": 1, "id": 1}})
+    pipeline.append({"$limit": limit + 1})
+    pipeline.append({"$project": {**model_projection(Job), "distance_m": 1}})
+    jobs = await db.jobs.aggregate(pipeline).to_list(limit + 1)
+    jobs = set_next_cursor(jobs, limit, "distance_m", response)
+    for job in jobs:
+        job["distance_km"] = round(job.pop("distance_m") / 1000, 3)
+    return jobs
+
+def with_geocode(job: dict) -> dict:
+    city, geo = geocode_location(job.get("location", ""))
+    return {**job, "city": city, "geo": geo}
+
+async def backfill_job_geocodes():
+    updates = []
+    async for job in db.jobs.find({"city": {"$exists": False}}, {"_id": 0, "id": 1, "location": 1}):
+        city, geo = geocode_location(job.get("location", ""))
+        updates.append(UpdateOne({"id": job["id"]}, {"$set": {"city": city, "geo": geo}}))
+        if len(updates) >= 1000:
+            await db.jobs.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.jobs.bulk_write(updates, ordered=False)
+
+# ==================== JOB LISTING CACHE ====================
+
+# GET /api/jobs pages are cached as serialized JSON keyed by the normalized
+# query. A job write evicts exactly the entries whose filters the old or new
+# version of the job satisfies; the TTL covers writes made by other workers.
+JOB_LISTING_CACHE_MAX_BYTES = int(os.environ.get('JOB_LISTING_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+JOB_LISTING_CACHE_TTL = float(os.environ.get('JOB_LISTING_CACHE_TTL', '30'))
+job_listing_cache = ByteLRUCache(JOB_LISTING_CACHE_MAX_BYTES, JOB_LISTING_CACHE_TTL)  # key -> (filters, body, etag, next_cursor)
+JOB_FACET_CACHE_SIZE = int(os.environ.get('JOB_FACET_CACHE_SIZE', '500'))
+job_facet_cache = TTLCache(JOB_FACET_CACHE_SIZE, JOB_LISTING_CACHE_TTL)  # key -> (filters, facet counts)
+
+def job_listing_filters(category, duration_type, location, search, status, employer_id, geo=None) -> dict:
+    return {
+        "geo": geo,
+        "category": category if category and category != "all" else None,
+        "duration_type": duration_type if duration_type and duration_type != "all" else None,
+        "location": location or None,
+        "search": " ".join(analyze(search)) if search and search.strip() else None,
+        "status": status or None,
+        "employer_id": employer_id or None
+    }
+
+def job_matches_listing(job: dict, filters: dict) -> bool:
+    for field in ("category", "duration_type", "status", "employer_id"):
+        if filters[field] and job.get(field) != filters[field]:
+            return False
+    # Location patterns come from anonymous queries and are never evaluated in-process;
+    # like text relevance and distance, they are treated as matching, so such
+    # entries are evicted whenever the other filters match
+    return True
+
+def invalidate_job_listings(*jobs: dict):
+    for key, (_, _, (filters, *_)) in list(job_listing_cache.entries.items()):
+        if any(job and job_matches_listing(job, filters) for job in jobs):
+            job_listing_cache.pop(key)
+    for key, (_, (filters, _)) in list(job_facet_cache.entries.items()):
+        # Category and duration counts ignore their own selection, so only the other filters decide
+        unselected = {**filters, "category": None, "duration_type": None}
+        if any(job and job_matches_listing(job, unselected) for job in jobs):
+            job_facet_cache.pop(key)
+
+# ==================== VIEW COUNTER ====================
+
+# Job views are accumulated in memory and flushed as one unordered bulk write,
+# so reading a job no longer costs a write on the hottest documents.
+VIEW_FLUSH_SECONDS = float(os.environ.get('VIEW_FLUSH_SECONDS', '5'))
+pending_views = defaultdict(int)
+
+async def flush_views():
+    global pending_views
+    if not pending_views:
+        return
+    batch, pending_views = pending_views, defaultdict(int)
+    try:
+        await db.jobs.bulk_write(
+            [UpdateOne({"id": job_id}, {"$inc": {"views": count}}) for job_id, count in batch.items()],
+            ordered=False
+        )
+    except Exception as e:
+        # Keep the increments for the next flush rather than lose them
+        logger.error(f"View counter flush failed: {e}")
+        for job_id, count in batch.items():
+            pending_views[job_id] += count
+
+async def flush_views_periodically():
+    while True:
+        await asyncio.sleep(VIEW_FLUSH_SECONDS)
+        await flush_views()
+
+# ==================== REAL-TIME PUB/SUB ====================
+
+# Topics fan out in-process to bounded per-subscriber queues. A subscriber that
+# falls PUBSUB_QUEUE_SIZE events behind is cut off and must resync over HTTP.
+# The backend decides how events reach other workers (PUBSUB_BACKEND=local|mongo).
+PUBSUB_BACKEND = os.environ.get('PUBSUB_BACKEND', 'local')
+PUBSUB_QUEUE_SIZE = int(os.environ.get('PUBSUB_QUEUE_SIZE', '100'))
+PUBSUB_CAPPED_BYTES = int(os.environ.get('PUBSUB_CAPPED_BYTES', str(16 * 1024 * 1024)))
+
+class Subscription:
+    def __init__(self, maxsize: int):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def offer(self, payload: dict):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and wake it with a sentinel so it disconnects
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[dict]:
+        return await self.queue.get()
+
+class LocalPubSubBackend:
+    """Single-process backend: publishing delivers straight to local subscribers."""
+
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, topic: str, payload: dict):
+        self.deliver(topic, payload)
+
+    async def stop(self):
+        pass
+
+class MongoPubSubBackend:
+    """Cross-worker backend tailing a capped collection that every worker appends to."""
+
+    def __init__(self, collection_name: str = "pubsub_events"):
+        self.collection_name = collection_name
+        self.origin = WORKER_ID
+        self.task = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        try:
+            await db.create_collection(self.collection_name, capped=True, size=PUBSUB_CAPPED_BYTES)
+        except CollectionInvalid:
+            pass
+        self.collection = db[self.collection_name]
+        # Tailable cursors die on an empty capped collection, so make sure there is a marker
+        await self.collection.insert_one({"topic": None, "origin": self.origin})
+        last = await self.collection.find_one({}, sort=[("$natural", -1)])
+        self.task = asyncio.create_task(self.tail(last["_id"]))
+
+    async def tail(self, last_id):
+        while True:
+            try:
+                cursor = self.collection.find({"_id": {"$gt": last_id}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        last_id = event["_id"]
+                        # Events from this worker were already delivered locally on publish
+                        if event["topic"] and event["origin"] != self.origin:
+                            self.deliver(event["topic"], event["payload"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pub/sub tail failed: {e}")
+            await asyncio.sleep(1)
+
+    async def publish(self, topic: str, payload: dict):
+        self.deliver(topic, payload)
+        await self.collection.insert_one({"topic": topic, "payload": payload, "origin": self.origin})
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+
+class PubSub:
+    def __init__(self, backend):
+        self.backend = backend
+        self.topics = defaultdict(set)
+        self.published = 0
+        self.overflows = 0
+
+    async def start(self):
+        await self.backend.start(self.deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    def subscribe(self, topic: str) -> Subscription:
+        subscription = Subscription(PUBSUB_QUEUE_SIZE)
+        self.topics[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, topic: str, subscription: Subscription):
+        subscribers = self.topics.get(topic)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self.topics[topic]
+
+    def deliver(self, topic: str, payload: dict):
+        for subscription in list(self.topics.get(topic, ())):
+            subscription.offer(payload)
+            if subscription.overflowed:
+                self.overflows += 1
+                self.unsubscribe(topic, subscription)
+
+    async def publish(self, topic: str, payload: dict):
+        self.published += 1
+        await self.backend.publish(topic, payload)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "topics": len(self.topics),
+            "subscribers": sum(len(s) for s in self.topics.values()),
+            "published": self.published,
+            "overflows": self.overflows
+        }
+
+pubsub = PubSub(MongoPubSubBackend() if PUBSUB_BACKEND == "mongo" else LocalPubSubBackend())
+
+def conversation_topic(conversation_id: str) -> str:
+    return f"conversation:{conversation_id}"
+
+def notification_topic(user_id: str) -> str:
+    return f"notifications:{user_id}"
+
+# ==================== OUTBOX ====================
+
+# Side effects of user-facing writes (notifications, the acceptance welcome
+# conversation) are recorded as outbox events and applied in batches by a
+# background worker. The events are pushed into the written document's "outbox"
+# array by the same single-document write, so they commit atomically with it
+# without multi-document transactions; the worker relays them into the outbox
+# collection. Events carry pre-generated ids, so a retried batch is idempotent.
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '200'))
+OUTBOX_POLL_SECONDS = float(os.environ.get('OUTBOX_POLL_SECONDS', '1'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_LEASE = timedelta(seconds=60)
+outbox_wakeup = asyncio.Event()
+outbox_metrics = {"processed": 0, "retried": 0, "dead_lettered": 0, "batch": LatencyStats()}
+
+def outbox_event(type: str, payload: dict) -> dict:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "type": type,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "created_at": now,
+        "available_at": now
+    }
+
+def notification_event(user_id: str, type: str, message: str) -> dict:
+    return outbox_event("notification", Notification(user_id=user_id, type=type, message=message).model_dump())
+
+# Collections whose documents may carry events in an "outbox" array
+OUTBOX_SOURCES = ("applications",)
+
+async def relay_outbox_events() -> int:
+    # Copies embedded events into the outbox, then pulls what was copied. A crash
+    # in between only re-inserts the same ids, which is ignored
+    relayed = 0
+    for source in OUTBOX_SOURCES:
+        docs = await db[source].find(
+            {"outbox.id": {"$exists": True}}, {"_id": 0, "id": 1, "outbox": 1}
+        ).limit(OUTBOX_BATCH_SIZE).to_list(OUTBOX_BATCH_SIZE)
+        events = [event for doc in docs for event in doc["outbox"]]
+        if not events:
+            continue
+        failed = await insert_ignoring_duplicates(db.outbox, [dict(event) for event in events])
+        for index, error in failed.items():
+            logger.error(f"Outbox relay of {events[index]['id']} from {source} failed: {error}")
+        failed_ids = {events[index]["id"] for index in failed}
+        await db[source].bulk_write([
+            UpdateOne({"id": doc["id"]}, {"$pull": {"outbox": {"id": {"$in": [
+                event["id"] for event in doc["outbox"] if event["id"] not in failed_ids
+            ]}}}})
+            for doc in docs
+        ], ordered=False)
+        relayed += len(events) - len(failed)
+    return relayed
+
+async def insert_ignoring_duplicates(collection, docs: List[dict]) -> Dict[int, str]:
+    # A retried batch may find some of its documents already written; any other
+    # write error is returned by the index of the document that caused it
+    if not docs:
+        return {}
+    try:
+        await collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return {
+            error["index"]: error.get("errmsg", "Write failed")
+            for error in e.details.get("writeErrors", [])
+            if error["code"] != 11000
+        }
+    return {}
+
+# Handlers return the events they could not apply as {index in events: error};
+# everything else in the group counts as done.
+async def apply_notification_events(events: List[dict]) -> Dict[int, str]:
+    notifications = [dict(event["payload"]) for event in events]
+    failed = await insert_ignoring_duplicates(db.notifications, [dict(n) for n in notifications])
+    for index, notification in enumerate(notifications):
+        if index not in failed:
+            await pubsub.publish(notification_topic(notification["user_id"]), {"type": "notification", "notification": notification})
+    return failed
+
+async def apply_welcome_events(events: List[dict]) -> Dict[int, str]:
+    payloads = [event["payload"] for event in events]
+    existing = await db.conversations.find(
+        {"$or": [{"job_id": p["job_id"], "candidate_id": p["candidate_id"]} for p in payloads]},
+        {"_id": 0, "id": 1, "job_id": 1, "candidate_id": 1}
+    ).to_list(None)
+    # A conversation we created on an earlier attempt has the event's id; keep going so its message lands
+    taken = {(c["job_id"], c["candidate_id"]): c["id"] for c in existing}
+    conversations, messages, sources = [], [], []  # sources: event index per conversation/message pair
+    for index, payload in enumerate(payloads):
+        key = (payload["job_id"], payload["candidate_id"])
+        if taken.get(key, payload["conversation_id"]) != payload["conversation_id"]:
+            continue
+        taken[key] = payload["conversation_id"]
+        message = Message(
+            id=payload["message_id"],
+            conversation_id=payload["conversation_id"],
+            sender_id="system",
+            sender_name="Jobni",
+            message_text=payload["message_text"]
+        )
+        preview = MessagePreview(text=message.message_text[:MESSAGE_PREVIEW_CHARS], **message.model_dump(exclude={"message_text"}))
+        conversation = Conversation(
+            id=payload["conversation_id"],
+            job_id=payload["job_id"],
+            candidate_id=payload["candidate_id"],
+            employer_id=payload["employer_id"],
+            last_activity_at=message.created_at,
+            last_message=preview,
+            unread={payload["candidate_id"]: 1, payload["employer_id"]: 1}
+        )
+        conversations.append(conversation.model_dump())
+        messages.append(message.model_dump())
+        sources.append(index)
+    errors = await insert_ignoring_duplicates(db.conversations, conversations)
+    failed = {sources[row]: error for row, error in errors.items()}
+    # A welcome message is only written once its conversation exists
+    rows = [row for row in range(len(messages)) if sources[row] not in failed]
+    errors = await insert_ignoring_duplicates(db.messages, [dict(messages[row]) for row in rows])
+    failed.update({sources[rows[position]]: error for position, error in errors.items()})
+    for row in rows:
+        if sources[row] not in failed:
+            await pubsub.publish(conversation_topic(messages[row]["conversation_id"]), {"type": "message", "message": messages[row]})
+    return failed
+
+OUTBOX_HANDLERS = {
+    "notification": apply_notification_events,
+    "conversation_welcome": apply_welcome_events,
+}
+
+async def claim_outbox_batch() -> List[dict]:
+    now = datetime.now(timezone.utc)
+    candidates = await db.outbox.find(
+        {"$or": [
+            {"status": "pending", "available_at": {"$lte": now}},
+            {"status": "processing", "lease_until": {"$lt": now}}
+        ]},
+        {"_id": 0, "id": 1}
+    ).sort("available_at", 1).limit(OUTBOX_BATCH_SIZE).to_list(OUTBOX_BATCH_SIZE)
+    if not candidates:
+        return []
+    claim = str(uuid.uuid4())
+    # Re-check the status in the update so two workers never claim the same event
+    await db.outbox.update_many(
+        {"id": {"$in": [c["id"] for c in candidates]}, "$or": [
+            {"status": "pending"},
+            {"status": "processing", "lease_until": {"$lt": now}}
+        ]},
+        {"$set": {"status": "processing", "claim": claim, "lease_until": now + OUTBOX_LEASE}}
+    )
+    return await db.outbox.find({"claim": claim, "status": "processing"}, {"_id": 0}).to_list(None)
+
+async def process_outbox_batch() -> int:
+    events = await claim_outbox_batch()
+    if not events:
+        return 0
+    start = time.perf_counter()
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[event["type"]].append(event)
+    for type, group in by_type.items():
+        failed = await apply_outbox_group(type, group)
+        if failed:
+            logger.error(f"Outbox {type}: {len(failed)} of {len(group)} events failed")
+            await fail_outbox_events([event for event in group if event["id"] in failed], failed)
+        done = [event["id"] for event in group if event["id"] not in failed]
+        if done:
+            await db.outbox.delete_many({"id": {"$in": done}})
+            outbox_metrics["processed"] += len(done)
+    outbox_metrics["batch"].observe(time.perf_counter() - start)
+    return len(events)
+
+async def apply_outbox_group(type: str, group: List[dict]) -> Dict[str, str]:
+    # Returns event id -> error for the events that failed. Write errors name their
+    # events; any other exception is narrowed down by bisecting the group, which is
+    # safe because handlers are idempotent
+    try:
+        failed = await OUTBOX_HANDLERS[type](group)
+    except Exception as e:
+        if len(group) == 1:
+            return {group[0]["id"]: str(e) or e.__class__.__name__}
+        middle = len(group) // 2
+        return {
+            **await apply_outbox_group(type, group[:middle]),
+            **await apply_outbox_group(type, group[middle:])
+        }
+    return {group[index]["id"]: error for index, error in failed.items()}
+
+async def fail_outbox_events(events: List[dict], errors: Dict[str, str]):
+    now = datetime.now(timezone.utc)
+    updates = []
+    for event in events:
+        error = errors[event["id"]]
+        attempts = event["attempts"] + 1
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            update = {"status": "dead", "attempts": attempts, "last_error": error, "claim": None}
+            outbox_metrics["dead_lettered"] += 1
+        else:
+            # Exponential backoff, capped at five minutes
+            delay = min(2 ** attempts, 300)
+            update = {"status": "pending", "attempts": attempts, "last_error": error, "claim": None,
+                      "available_at": now + timedelta(seconds=delay)}
+            outbox_metrics["retried"] += 1
+        updates.append(UpdateOne({"id": event["id"]}, {"$set": update}))
+    await db.outbox.bulk_write(updates, ordered=False)
+
+async def run_outbox_worker():
+    while True:
+        try:
+            # Drain full batches back to back, then sleep until woken or the poll interval passes
+            while await relay_outbox_events() >= OUTBOX_BATCH_SIZE:
+                pass
+            while await process_outbox_batch() >= OUTBOX_BATCH_SIZE:
+                pass
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Outbox worker failed: {e}")
+        try:
+            await asyncio.wait_for(outbox_wakeup.wait(), OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        outbox_wakeup.clear()
+
+async def outbox_stats() -> dict:
+    depth = await count_by(db.outbox, "status")
+    return {
+        "pending": depth.get("pending", 0),
+        "processing": depth.get("processing", 0),
+        "dead": depth.get("dead", 0),
+        "processed": outbox_metrics["processed"],
+        "retried": outbox_metrics["retried"],
+        "dead_lettered": outbox_metrics["dead_lettered"],
+        "batch": outbox_metrics["batch"].stats()
+    }
+
+# ==================== BULK IMPORT ====================
+
+# Job uploads are read from the request stream one record at a time, validated
+# against JobCreate as they arrive and written in unordered insert_many chunks.
+# No line or CSV record may exceed BULK_MAX_RECORD_CHARS, so memory is bounded by
+# one chunk plus one record whatever the upload size.
+BULK_INSERT_CHUNK = int(os.environ.get('BULK_INSERT_CHUNK', '500'))
+BULK_MAX_ROWS = int(os.environ.get('BULK_MAX_ROWS', '10000'))
+BULK_MAX_RECORD_CHARS = int(os.environ.get('BULK_MAX_RECORD_CHARS', '65536'))
+BULK_LIST_SEPARATOR = "|"  # separates the requirements inside one CSV cell
+
+async def stream_lines(chunks):
+    # Yields (line number, text) for each line of a UTF-8 byte stream; text is None
+    # for a line longer than BULK_MAX_RECORD_CHARS, which is skipped up to its newline
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    number = 0
+    skipping = False
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            number += 1
+            too_long = skipping or len(line) > BULK_MAX_RECORD_CHARS
+            skipping = False
+            yield number, None if too_long else line.rstrip("\r")
+        if len(buffer) > BULK_MAX_RECORD_CHARS:
+            skipping, buffer = True, ""
+    buffer += decoder.decode(b"", final=True)
+    if skipping or len(buffer) > BULK_MAX_RECORD_CHARS:
+        yield number + 1, None
+    elif buffer:
+        yield number + 1, buffer.rstrip("\r")
+
+def parse_csv_record(lines: List[str]) -> Optional[List[str]]:
+    # Parses one record from lines ending in "\n"; None when csv.reader asked for
+    # another line, i.e. a quoted field continues past the last one
+    state = {"starved": False}
+    def feed():
+        yield from lines
+        state["starved"] = True
+    row = next(csv.reader(feed()), [])
+    return None if state["starved"] else row
+
+async def csv_records(chunks):
+    # Yields (line number, dict or error message); quoted fields may span lines
+    header = None
+    record, start, size = [], 0, 0
+    async for number, line in stream_lines(chunks):
+        if line is None:
+            yield (start if record else number), f"Record longer than {BULK_MAX_RECORD_CHARS} characters"
+            record, size = [], 0
+            continue
+        if not record:
+            if not line.strip():
+                continue
+            start = number
+        record.append(line + "\n")
+        size += len(line) + 1
+        try:
+            row = parse_csv_record(record)
+        except csv.Error as e:
+            yield start, f"Invalid CSV: {e}"
+            record, size = [], 0
+            continue
+        if row is None:
+            if size > BULK_MAX_RECORD_CHARS:
+                yield start, f"Record longer than {BULK_MAX_RECORD_CHARS} characters (unterminated quoted field?)"
+                record, size = [], 0
+            continue
+        record, size = [], 0
+        if header is None:
+            header = [name.strip() for name in row]
+            continue
+        if len(row) != len(header):
+            yield start, f"Expected {len(header)} columns, got {len(row)}"
+            continue
+        values = {name: value.strip() for name, value in zip(header, row) if value.strip()}
+        if "requirements" in values:
+            values["requirements"] = [r.strip() for r in values["requirements"].split(BULK_LIST_SEPARATOR) if r.strip()]
+        yield start, values
+    if record:
+        yield start, "Unterminated quoted field"
+
+async def ndjson_records(chunks):
+    async for number, line in stream_lines(chunks):
+        if line is None:
+            yield number, f"Line longer than {BULK_MAX_RECORD_CHARS} characters"
+            continue
+        if not line.strip():
+            continue
+        try:
+            value = json.loads(line)
+        except ValueError as e:
+            yield number, f"Invalid JSON: {e}"
+            continue
+        yield number, value if isinstance(value, dict) else "Each line must be a JSON object"
+
+async def insert_job_chunk(chunk: List[tuple], errors: List[dict]) -> int:
+    docs = [doc for _, doc in chunk]
+    failed = set()
+    try:
+        # insert_many adds _id to what it is given, so it gets copies
+        await db.jobs.insert_many([dict(doc) for doc in docs], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed.add(error["index"])
+            errors.append({"line": chunk[error["index"]][0], "errors": [error.get("errmsg", "Insert failed")]})
+    inserted = [doc for index, doc in enumerate(docs) if index not in failed]
+    for doc in inserted:
+        index_job(doc)
+    invalidate_job_listings(*inserted)
+    return len(inserted)
+
 # ==================== AUTH FUNCTIONS ====================
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+# Decoded tokens and authenticated users are cached per process. The TTL bounds
+# how long a write made by another worker can go unseen.
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', '10000'))
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', '60'))
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)  # token -> user id
+user_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)  # user id -> User
+
+def invalidate_user(user_id: str):
+    user_cache.pop(user_id)
+
+# bcrypt releases the GIL, so hashing runs on a small thread pool instead of
+# blocking the event loop. Beyond PASSWORD_HASH_MAX_PENDING queued calls we shed
+# load with a 503 rather than let logins pile up behind each other.
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '4'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_metrics = {
+    "pending": 0,
+    "rejected": 0,
+    "rehashed": 0,
+    "hash": LatencyStats(),
+    "verify": LatencyStats()
+}
+
+async def run_password_task(kind: str, func, *args):
+    if password_metrics["pending"] >= PASSWORD_HASH_MAX_PENDING:
+        password_metrics["rejected"] += 1
+        raise HTTPException(status_code=503, detail="Server busy, please retry", headers={"Retry-After": "1"})
+    password_metrics["pending"] += 1
+    start = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+    finally:
+        password_metrics["pending"] -= 1
+        password_metrics[kind].observe(time.perf_counter() - start)
+
+async def verify_and_update_password(plain_password, hashed_password):
+    # Returns (valid, new_hash); new_hash is set when the stored hash uses outdated parameters
+    return await run_password_task("verify", pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await run_password_task("hash", pwd_context.hash, password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def password_stats() -> dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "rounds": BCRYPT_ROUNDS,
+        "pending": password_metrics["pending"],
+        "rejected": password_metrics["rejected"],
+        "rehashed": password_metrics["rehashed"],
+        "hash": password_metrics["hash"].stats(),
+        "verify": password_metrics["verify"].stats()
+    }
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -177,16 +2030,26 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate_token(credentials.credentials)
+
+async def authenticate_token(token: str) -> User:
     try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        user_id = token_cache.get(token)
         if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id = payload.get("sub")
+            if user_id is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+            # Never keep a token cached past its own expiry
+            token_cache.set(token, user_id, min(AUTH_CACHE_TTL, payload["exp"] - time.time()))
+        current_user = user_cache.get(user_id)
+        if current_user is None:
+            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+            if user is None:
+                raise HTTPException(status_code=401, detail="User not found")
+            current_user = User(**user)
+            user_cache.set(user_id, current_user)
+        return current_user
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
@@ -204,7 +2067,7 @@ async def register(user_data: UserCreate):
     # Create user
     user_dict = user_data.model_dump()
     password = user_dict.pop("password")
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash(password)
     
     user = User(**user_dict)
     doc = user.model_dump()
@@ -223,9 +2086,14 @@ async def login(credentials: UserLogin):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    if not verify_password(credentials.password, user_doc["password"]):
+    valid, new_hash = await verify_and_update_password(credentials.password, user_doc["password"])
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    if new_hash:
+        await db.users.update_one({"id": user_doc["id"]}, {"$set": {"password": new_hash}})
+        password_metrics["rehashed"] += 1
+    
     user_doc.pop("password")
     user = User(**user_doc)
     
@@ -244,50 +2112,249 @@ async def create_job(job_data: JobCreate, current_user: User = Depends(get_curre
     if current_user.role not in ["employer", "admin"]:
         raise HTTPException(status_code=403, detail="Only employers can post jobs")
     
-    job = Job(**job_data.model_dump(), employer_id=current_user.id)
+    job = Job(**with_geocode(job_data.model_dump()), employer_id=current_user.id)
     doc = job.model_dump()
     await db.jobs.insert_one(doc)
+    index_job(doc)
+    invalidate_job_listings(doc)
     
     return job
 
-@api_router.get("/jobs", response_model=List[Job])
+@api_router.post("/jobs/bulk")
+async def bulk_create_jobs(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role not in ["employer", "admin"]:
+        raise HTTPException(status_code=403, detail="Only employers can post jobs")
+    
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    records = csv_records(request.stream()) if format == "csv" else ndjson_records(request.stream())
+    
+    received = inserted = 0
+    truncated = False
+    errors = []
+    chunk = []
+    async for line, record in records:
+        if received == BULK_MAX_ROWS:
+            truncated = True  # rows past the limit are not read
+            break
+        received += 1
+        if isinstance(record, str):
+            errors.append({"line": line, "errors": [record]})
+            continue
+        try:
+            job_data = JobCreate.model_validate(record)
+        except ValidationError as e:
+            errors.append({"line": line, "errors": [
+                f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+            ]})
+            continue
+        chunk.append((line, Job(**with_geocode(job_data.model_dump()), employer_id=current_user.id).model_dump()))
+        if len(chunk) >= BULK_INSERT_CHUNK:
+            inserted += await insert_job_chunk(chunk, errors)
+            chunk = []
+    if chunk:
+        inserted += await insert_job_chunk(chunk, errors)
+    
+    errors.sort(key=lambda error: error["line"])
+    return json_response({
+        "received": received,
+        "inserted": inserted,
+        "failed": len(errors),
+        "truncated": truncated,
+        "errors": errors
+    })
+
+@api_router.get("/jobs", response_model=List[JobSearchResult])
 async def get_jobs(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     duration_type: Optional[str] = None,
     location: Optional[str] = None,
     search: Optional[str] = None,
-    status: Optional[str] = "active"
+    status: Optional[str] = "active",
+    employer_id: Optional[str] = None,
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=2000),
+    bbox: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit)
 ):
+    geo = listing_geo(near_lat, near_lng, radius_km, bbox)
+    filters = job_listing_filters(category, duration_type, location, search, status, employer_id, geo)
+    key = json.dumps([filters, cursor, limit], sort_keys=True)
+    entry = job_listing_cache.get(key)
+    if entry is None:
+        jobs = await query_jobs(response, category, duration_type, location, search, status, employer_id, geo, cursor, limit)
+        body = dump_json(jobs)
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        entry = (filters, body, etag, response.headers.get(NEXT_CURSOR_HEADER))
+        job_listing_cache.set(key, entry, len(body) + len(key))
+    
+    # A hit never touches MongoDB or Pydantic: the stored bytes go out as-is
+    _, body, etag, next_cursor = entry
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers[NEXT_CURSOR_HEADER] = next_cursor
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def listing_geo(near_lat: Optional[float], near_lng: Optional[float], radius_km: float, bbox: Optional[str]) -> Optional[dict]:
+    if (near_lat is None) != (near_lng is None):
+        raise HTTPException(status_code=400, detail="near_lat and near_lng must be given together")
+    if near_lat is None and not bbox:
+        return None
+    return {
+        "near": [near_lng, near_lat] if near_lat is not None else None,
+        "radius_km": radius_km if near_lat is not None else None,
+        "bbox": parse_bbox(bbox) if bbox else None
+    }
+
+def job_listing_query(category, duration_type, location, status, employer_id) -> dict:
     query = {}
+    if employer_id:
+        query["employer_id"] = employer_id
     if category and category != "all":
         query["category"] = category
     if duration_type and duration_type != "all":
         query["duration_type"] = duration_type
     if location:
         query["location"] = {"$regex": location, "$options": "i"}
-    if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"company_name": {"$regex": search, "$options": "i"}}
-        ]
     if status:
         query["status"] = status
-    
-    jobs = await db.jobs.find(query, {"_id": 0}).sort("posted_date", -1).to_list(1000)
-    return jobs
+    return query
+
+async def query_jobs(response: Response, category, duration_type, location, search, status, employer_id, geo, cursor, limit) -> list:
+    query = job_listing_query(category, duration_type, location, status, employer_id)
+    
+    if search and search.strip():
+        if geo:
+            query["geo"] = geo_filter(geo["near"], geo["radius_km"], geo["bbox"])
+        return await search_jobs(query, search, cursor, limit, response)
+    
+    if geo:
+        if geo["bbox"]:
+            # Order a bounding-box query by distance from the box centre
+            min_lng, min_lat, max_lng, max_lat = geo["bbox"]
+            query["geo"] = geo_filter(None, 0, geo["bbox"])
+            near = geo["near"] or [(min_lng + max_lng) / 2, (min_lat + max_lat) / 2]
+            return await geo_search_jobs(query, near, geo["radius_km"] if geo["near"] else None, cursor, limit, response)
+        return await geo_search_jobs(query, geo["near"], geo["radius_km"], cursor, limit, response)
+    
+    return await paginate(db.jobs, query, "posted_date", DESCENDING, limit, cursor, response, model_projection(Job))
+
+SALARY_FACET_BOUNDARIES = [0, 100, 250, 500, 1000]
+
+async def query_job_facets(category, duration_type, location, search, status, employer_id, geo) -> dict:
+    # Disjunctive facets: category and duration counts ignore their own selection
+    # so the other options stay visible; every other filter applies to all facets
+    query = job_listing_query(None, None, location, status, employer_id)
+    if geo:
+        query["geo"] = geo_filter(geo["near"], geo["radius_km"], geo["bbox"])
+    if search and search.strip():
+        # Every hit, already narrowed to the status/employer in the query; category
+        # and duration stay out since their facets ignore their own selection
+        hits = job_search_index.search(search, limit=None, filters=search_filters(query))
+        query["id"] = {"$in": [job_id for job_id, _ in hits]}
+    selected = job_listing_query(category, duration_type, None, None, None)
+    
+    def narrowed(*stages, own=None):
+        match = {field: value for field, value in selected.items() if field != own}
+        return ([{"$match": match}] if match else []) + list(stages)
+    
+    def count_values(field):
+        return {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+    
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "category": narrowed(count_values("category"), own="category"),
+            "duration_type": narrowed(count_values("duration_type"), own="duration_type"),
+            "city": narrowed({"$match": {"city": {"$ne": None}}}, count_values("city")),
+            "salary": narrowed({"$bucket": {
+                "groupBy": "$salary",
+                "boundaries": SALARY_FACET_BOUNDARIES + [float("inf")],
+                "default": "other",
+                "output": {"count": {"$sum": 1}}
+            }}),
+            "total": narrowed({"$count": "count"})
+        }}
+    ]
+    result = (await db.jobs.aggregate(pipeline).to_list(1))[0]
+    
+    def values(rows):
+        return sorted(({"value": row["_id"], "count": row["count"]} for row in rows), key=lambda row: (-row["count"], str(row["value"])))
+    
+    salaries = {row["_id"]: row["count"] for row in result["salary"]}
+    return {
+        "total": result["total"][0]["count"] if result["total"] else 0,
+        "category": values(result["category"]),
+        "duration_type": values(result["duration_type"]),
+        "city": values(result["city"]),
+        "salary": [
+            {"min": low, "max": high, "count": salaries.get(low, 0)}
+            for low, high in zip(SALARY_FACET_BOUNDARIES, SALARY_FACET_BOUNDARIES[1:] + [None])
+        ]
+    }
+
+@api_router.get("/jobs/facets")
+async def get_job_facets(
+    category: Optional[str] = None,
+    duration_type: Optional[str] = None,
+    location: Optional[str] = None,
+    search: Optional[str] = None,
+    status: Optional[str] = "active",
+    employer_id: Optional[str] = None,
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(DEFAULT_RADIUS_KM, gt=0, le=2000),
+    bbox: Optional[str] = None
+):
+    geo = listing_geo(near_lat, near_lng, radius_km, bbox)
+    filters = job_listing_filters(category, duration_type, location, search, status, employer_id, geo)
+    key = json.dumps(filters, sort_keys=True)
+    entry = job_facet_cache.get(key)
+    if entry is None:
+        entry = (filters, await query_job_facets(category, duration_type, location, search, status, employer_id, geo))
+        job_facet_cache.set(key, entry)
+    return json_response(entry[1])
+
+@api_router.get("/jobs/recommended", response_model=List[JobSearchResult])
+async def get_recommended_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_user)
+):
+    applied = await db.applications.find(
+        {"applicant_id": current_user.id}, {"_id": 0, "job_id": 1}
+    ).to_list(None)
+    hits = job_recommender.top_k(current_user.skills, limit, {a["job_id"] for a in applied})
+    if not hits:
+        return json_response([])
+    
+    scores = dict(hits)
+    jobs = await db.jobs.find({"id": {"$in": list(scores)}, "status": "active"}, model_projection(Job)).to_list(len(scores))
+    for job in jobs:
+        job["score"] = round(scores[job["id"]], 4)
+    jobs.sort(key=lambda job: job["score"], reverse=True)
+    return json_response(jobs)
 
 @api_router.get("/jobs/{job_id}", response_model=Job)
 async def get_job(job_id: str):
-    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    job = await db.jobs.find_one({"id": job_id}, model_projection(Job))
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    # Increment views
-    await db.jobs.update_one({"id": job_id}, {"$inc": {"views": 1}})
-    job["views"] = job.get("views", 0) + 1
+    # Increment views; the stored count lags by at most one flush interval
+    pending_views[job_id] += 1
+    job["views"] = job.get("views", 0) + pending_views[job_id]
     
-    return Job(**job)
+    return json_response(job)
 
 @api_router.put("/jobs/{job_id}", response_model=Job)
 async def update_job(job_id: str, job_data: JobCreate, current_user: User = Depends(get_current_user)):
@@ -298,11 +2365,14 @@ async def update_job(job_id: str, job_data: JobCreate, current_user: User = Depe
     if job["employer_id"] != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    update_data = job_data.model_dump()
+    update_data = with_geocode(job_data.model_dump())
     await db.jobs.update_one({"id": job_id}, {"$set": update_data})
     
-    updated_job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
-    return Job(**updated_job)
+    updated_job = await db.jobs.find_one({"id": job_id}, model_projection(Job))
+    index_job(updated_job)
+    invalidate_job_listings(job, updated_job)
+    applicant_ranking_cache.pop(job_id)
+    return json_response(updated_job)
 
 @api_router.delete("/jobs/{job_id}")
 async def delete_job(job_id: str, current_user: User = Depends(get_current_user)):
@@ -314,6 +2384,9 @@ async def delete_job(job_id: str, current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=403, detail="Not authorized")
     
     await db.jobs.delete_one({"id": job_id})
+    unindex_job(job_id)
+    invalidate_job_listings(job)
+    applicant_ranking_cache.pop(job_id)
     return {"message": "Job deleted successfully"}
 
 # ==================== APPLICATION ROUTES ====================
@@ -342,20 +2415,28 @@ async def create_application(app_data: ApplicationCreate, current_user: User = D
         employer_id=job["employer_id"]
     )
     doc = application.model_dump()
-    await db.applications.insert_one(doc)
-    
-    # Create notification for employer
-    notification = Notification(
-        user_id=job["employer_id"],
-        type="new_application",
-        message=f"تقدم {current_user.name} على وظيفة {job['title']}"
-    )
-    await db.notifications.insert_one(notification.model_dump())
+    # Notify employer; the event is stored with the application in one write
+    doc["outbox"] = [notification_event(
+        job["employer_id"],
+        "new_application",
+        f"تقدم {current_user.name} على وظيفة {job['title']}"
+    )]
+    try:
+        await db.applications.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already applied to this job")
+    outbox_wakeup.set()
     
+    applicant_ranking_cache.pop(app_data.job_id)
     return application
 
 @api_router.get("/applications", response_model=List[Application])
-async def get_applications(current_user: User = Depends(get_current_user)):
+async def get_applications(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
     if current_user.role == "job_seeker":
         query = {"applicant_id": current_user.id}
     elif current_user.role == "employer":
@@ -365,11 +2446,54 @@ async def get_applications(current_user: User = Depends(get_current_user)):
     else:
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    applications = await db.applications.find(query, {"_id": 0}).sort("applied_date", -1).to_list(1000)
-    return applications
+    applications = await paginate(db.applications, query, "applied_date", DESCENDING, limit, cursor, response, model_projection(Application))
+    return json_response(applications, response)
 
-@api_router.get("/applications/job/{job_id}", response_model=List[Application])
-async def get_job_applications(job_id: str, current_user: User = Depends(get_current_user)):
+@api_router.get("/applications/hydrated", response_model=List[HydratedApplication])
+async def get_hydrated_applications(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role == "job_seeker":
+        query = {"applicant_id": current_user.id}
+    elif current_user.role == "employer":
+        query = {"employer_id": current_user.id}
+    elif current_user.role == "admin":
+        query = {}
+    else:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    # One aggregation joins each page of applications to its job and applicant
+    projection = {field: 1 for field in Application.model_fields}
+    projection.update({f"job.{field}": 1 for field in JobSummary.model_fields})
+    projection.update({f"applicant.{field}": 1 for field in ApplicantSummary.model_fields})
+    projection["_id"] = 0
+    pipeline = [
+        {"$match": keyset_query(query, "applied_date", DESCENDING, cursor)},
+        {"$sort": {"applied_date": -1, "id": -1}},
+        {"$limit": limit + 1},
+        {"$lookup": {"from": "jobs", "localField": "job_id", "foreignField": "id", "as": "job"}},
+        {"$lookup": {"from": "users", "localField": "applicant_id", "foreignField": "id", "as": "applicant"}},
+        {"$set": {
+            "job": {"$arrayElemAt": ["$job", 0]},
+            "applicant": {"$arrayElemAt": ["$applicant", 0]}
+        }},
+        {"$project": projection}
+    ]
+    applications = await db.applications.aggregate(pipeline).to_list(limit + 1)
+    return json_response(set_next_cursor(applications, limit, "applied_date", response), response)
+
+@api_router.get("/applications/job/{job_id}", response_model=List[RankedApplication])
+async def get_job_applications(
+    job_id: str,
+    response: Response,
+    ranked: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
     # Check if user is employer of this job or admin
     job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
     if not job:
@@ -378,8 +2502,29 @@ async def get_job_applications(job_id: str, current_user: User = Depends(get_cur
     if job["employer_id"] != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    applications = await db.applications.find({"job_id": job_id}, {"_id": 0}).to_list(1000)
-    return applications
+    if not ranked:
+        applications = await paginate(db.applications, {"job_id": job_id}, "applied_date", DESCENDING, limit, cursor, response, model_projection(Application))
+        return json_response(applications, response)
+    
+    ranking = applicant_ranking_cache.get(job_id)
+    if ranking is None:
+        ranking = await rank_applicants(job)
+        applicant_ranking_cache.set(job_id, ranking)
+    
+    # Ranked pages are slices of the cached ranking; the cursor is the next offset
+    offset = decode_cursor(cursor, 1)[0] if cursor else 0
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    page = ranking[offset:offset + limit]
+    if offset + limit < len(ranking):
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(offset + limit)
+    
+    # Application fields are read fresh so status changes show without re-ranking
+    applications = await db.applications.find(
+        {"id": {"$in": [entry["id"] for entry in page]}}, model_projection(Application)
+    ).to_list(len(page))
+    by_id = {application["id"]: application for application in applications}
+    return json_response([{**by_id[entry["id"]], **entry} for entry in page if entry["id"] in by_id], response)
 
 @api_router.put("/applications/{app_id}", response_model=Application)
 async def update_application_status(
@@ -394,55 +2539,102 @@ async def update_application_status(
     if application["employer_id"] != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     
-    await db.applications.update_one(
-        {"id": app_id},
-        {"$set": {"status": status_data.status}}
-    )
-    
-    # Create notification for applicant
     job = await db.jobs.find_one({"id": application["job_id"]}, {"_id": 0})
     status_ar = {
         "accepted": "قُبل",
         "rejected": "رُفض",
         "completed": "اكتمل"
     }
-    notification = Notification(
-        user_id=application["applicant_id"],
-        type="application_update",
-        message=f"طلبك على وظيفة {job['title']} {status_ar.get(status_data.status, status_data.status)}"
-    )
-    await db.notifications.insert_one(notification.model_dump())
-    
-    # Create conversation when accepted
+    # Notify applicant
+    events = [notification_event(
+        application["applicant_id"],
+        "application_update",
+        f"طلبك على وظيفة {job['title']} {status_ar.get(status_data.status, status_data.status)}"
+    )]
+    
+    # Open a conversation with a welcome message when accepted (skipped by the worker if one exists)
     if status_data.status == "accepted":
-        # Check if conversation already exists
-        existing_conversation = await db.conversations.find_one({
+        events.append(outbox_event("conversation_welcome", {
+            "conversation_id": str(uuid.uuid4()),
+            "message_id": str(uuid.uuid4()),
             "job_id": application["job_id"],
-            "candidate_id": application["applicant_id"]
-        })
-        
-        if not existing_conversation:
-            conversation = Conversation(
-                job_id=application["job_id"],
-                candidate_id=application["applicant_id"],
-                employer_id=application["employer_id"]
-            )
-            await db.conversations.insert_one(conversation.model_dump())
-            
-            # Send welcome message
-            welcome_message = Message(
-                conversation_id=conversation.id,
-                sender_id="system",
-                sender_name="Jobni",
-                message_text=f"مرحباً 👋\nتم قبولك مبدئياً في وظيفة: {job['title']}\n\nالرجاء تأكيد حضورك وذكر أي استفسارات عن الموقع، الوقت، أو متطلبات العمل."
-            )
-            await db.messages.insert_one(welcome_message.model_dump())
+            "candidate_id": application["applicant_id"],
+            "employer_id": application["employer_id"],
+            "message_text": f"مرحباً 👋\nتم قبولك مبدئياً في وظيفة: {job['title']}\n\nالرجاء تأكيد حضورك وذكر أي استفسارات عن الموقع، الوقت، أو متطلبات العمل."
+        }))
     
-    updated_app = await db.applications.find_one({"id": app_id}, {"_id": 0})
-    return Application(**updated_app)
+    # The status change and its events land in the same single-document write
+    updated_app = await db.applications.find_one_and_update(
+        {"id": app_id},
+        {"$set": {"status": status_data.status}, "$push": {"outbox": {"$each": events}}},
+        projection=model_projection(Application),
+        return_document=ReturnDocument.AFTER
+    )
+    outbox_wakeup.set()
+    
+    return json_response(updated_app)
 
 # ==================== RATING ROUTES ====================
 
+def rating_star(value: float) -> str:
+    return str(min(max(int(round(value)), 1), 5))
+
+def rating_increment_pipeline(value: float) -> list:
+    # A single pipeline update keeps sum, count, histogram and average consistent
+    star = rating_star(value)
+    return [
+        {"$set": {
+            "rating_sum": {"$add": [{"$ifNull": ["$rating_sum", 0]}, value]},
+            "total_ratings": {"$add": [{"$ifNull": ["$total_ratings", 0]}, 1]},
+            f"rating_distribution.{star}": {"$add": [{"$ifNull": [f"$rating_distribution.{star}", 0]}, 1]}
+        }},
+        {"$set": {"rating": {"$divide": ["$rating_sum", "$total_ratings"]}}}
+    ]
+
+async def rebuild_rating_aggregates(user_id: Optional[str] = None):
+    # Users never rated through the API keep their stored average as the starting sum
+    seed_query = {"rating_sum": {"$exists": False}}
+    if user_id:
+        seed_query["id"] = user_id
+    await db.users.update_many(seed_query, [{"$set": {
+        "rating_sum": {"$multiply": [{"$ifNull": ["$rating", 0]}, {"$ifNull": ["$total_ratings", 0]}]},
+        "rating_distribution": {"$literal": {}}  # a bare {} is rejected inside a pipeline
+    }}])
+    
+    match = {"rated_id": user_id} if user_id else {}
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {"user": "$rated_id", "star": {"$min": [{"$max": [{"$round": ["$rating", 0]}, 1]}, 5]}},
+            "sum": {"$sum": "$rating"},
+            "count": {"$sum": 1}
+        }},
+        {"$group": {
+            "_id": "$_id.user",
+            "sum": {"$sum": "$sum"},
+            "count": {"$sum": "$count"},
+            "stars": {"$push": {"k": {"$toString": {"$toInt": "$_id.star"}}, "v": "$count"}}
+        }}
+    ]
+    updates = []
+    async for row in db.ratings.aggregate(pipeline):
+        updates.append(UpdateOne({"id": row["_id"]}, {"$set": {
+            "rating_sum": row["sum"],
+            "total_ratings": row["count"],
+            "rating": row["sum"] / row["count"],
+            "rating_distribution": {item["k"]: item["v"] for item in row["stars"]}
+        }}))
+        if len(updates) >= 1000:
+            await db.users.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.users.bulk_write(updates, ordered=False)
+    
+    if user_id:
+        invalidate_user(user_id)
+    else:
+        user_cache.clear()
+
 @api_router.post("/ratings", response_model=Rating)
 async def create_rating(rating_data: RatingCreate, current_user: User = Depends(get_current_user)):
     # Check if application exists and is completed
@@ -470,23 +2662,26 @@ async def create_rating(rating_data: RatingCreate, current_user: User = Depends(
         raise HTTPException(status_code=400, detail="Already rated this user for this job")
     
     rating = Rating(**rating_data.model_dump(), rater_id=current_user.id)
-    await db.ratings.insert_one(rating.model_dump())
-    
-    # Update user's average rating
-    all_ratings = await db.ratings.find({"rated_id": rating_data.rated_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r["rating"] for r in all_ratings) / len(all_ratings)
+    try:
+        await db.ratings.insert_one(rating.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Already rated this user for this job")
     
-    await db.users.update_one(
-        {"id": rating_data.rated_id},
-        {"$set": {"rating": avg_rating, "total_ratings": len(all_ratings)}}
-    )
+    # Update user's rating aggregates in place
+    await db.users.update_one({"id": rating_data.rated_id}, rating_increment_pipeline(rating.rating))
+    invalidate_user(rating_data.rated_id)
     
     return rating
 
 @api_router.get("/ratings/user/{user_id}", response_model=List[Rating])
-async def get_user_ratings(user_id: str):
-    ratings = await db.ratings.find({"rated_id": user_id}, {"_id": 0}).to_list(1000)
-    return ratings
+async def get_user_ratings(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit)
+):
+    ratings = await paginate(db.ratings, {"rated_id": user_id}, "date", DESCENDING, limit, cursor, response, model_projection(Rating))
+    return json_response(ratings, response)
 
 # ==================== SAVED JOBS ====================
 
@@ -529,31 +2724,133 @@ async def get_saved_jobs(current_user: User = Depends(get_current_user)):
 
 # ==================== CHAT SYSTEM ====================
 
-@api_router.get("/conversations", response_model=List[Conversation])
-async def get_conversations(current_user: User = Depends(get_current_user)):
-    if current_user.role == "admin":
-        conversations = await db.conversations.find({}, {"_id": 0}).to_list(1000)
-    elif current_user.role == "employer":
-        conversations = await db.conversations.find({"employer_id": current_user.id}, {"_id": 0}).to_list(1000)
-    else:
-        conversations = await db.conversations.find({"candidate_id": current_user.id}, {"_id": 0}).to_list(1000)
-    return conversations
-
-@api_router.get("/conversations/{conversation_id}/messages", response_model=List[Message])
-async def get_messages(conversation_id: str, current_user: User = Depends(get_current_user)):
-    # Check access
+async def get_conversation_for_user(conversation_id: str, current_user: User) -> dict:
     conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
     if current_user.role != "admin" and current_user.id not in [conversation["candidate_id"], conversation["employer_id"]]:
         raise HTTPException(status_code=403, detail="Not authorized")
+    return conversation
+
+MESSAGE_PREVIEW_CHARS = 120
+
+async def post_message(conversation: dict, sender_id: str, sender_name: str, message_text: str) -> Message:
+    message = Message(
+        conversation_id=conversation["id"],
+        message_text=message_text,
+        sender_id=sender_id,
+        sender_name=sender_name
+    )
+    await db.messages.insert_one(message.model_dump())
+    
+    # Keep the inbox summary current in the same single-document update
+    preview = MessagePreview(text=message_text[:MESSAGE_PREVIEW_CHARS], **message.model_dump(exclude={"message_text"}))
+    recipients = [uid for uid in (conversation["candidate_id"], conversation["employer_id"]) if uid != sender_id]
+    await db.conversations.update_one(
+        {"id": conversation["id"]},
+        {
+            "$set": {"last_message": preview.model_dump(), "last_activity_at": message.created_at},
+            "$inc": {f"unread.{uid}": 1 for uid in recipients}
+        }
+    )
     
+    await pubsub.publish(conversation_topic(conversation["id"]), {"type": "message", "message": message.model_dump()})
+    return message
+
+async def backfill_conversation_summaries():
+    # Latest message per conversation becomes its preview and activity timestamp
+    pipeline = [
+        {"$sort": {"conversation_id": 1, "created_at": -1, "id": -1}},
+        {"$group": {"_id": "$conversation_id", "last": {"$first": "$$ROOT"}}}
+    ]
+    updates = []
+    async for row in db.messages.aggregate(pipeline, allowDiskUse=True):
+        last = row["last"]
+        preview = MessagePreview(text=last["message_text"][:MESSAGE_PREVIEW_CHARS], **last)
+        updates.append(UpdateOne(
+            {"id": row["_id"], "last_activity_at": {"$exists": False}},
+            {"$set": {"last_message": preview.model_dump(), "last_activity_at": last["created_at"], "unread": {}}}
+        ))
+        if len(updates) >= 1000:
+            await db.conversations.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        await db.conversations.bulk_write(updates, ordered=False)
+    await db.conversations.update_many(
+        {"last_activity_at": {"$exists": False}},
+        [{"$set": {"last_activity_at": "$created_at", "unread": {"$literal": {}}}}]
+    )
+
+@api_router.get("/conversations", response_model=List[Conversation])
+async def get_conversations(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role == "admin":
+        query = {}
+    elif current_user.role == "employer":
+        query = {"employer_id": current_user.id}
+    else:
+        query = {"candidate_id": current_user.id}
+    conversations = await paginate(db.conversations, query, "last_activity_at", DESCENDING, limit, cursor, response, model_projection(Conversation))
+    return json_response(conversations, response)
+
+@api_router.get("/conversations/{conversation_id}/messages", response_model=List[Message])
+async def get_messages(
+    conversation_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
+    await get_conversation_for_user(conversation_id, current_user)
+    
+    messages = await paginate(db.messages, {"conversation_id": conversation_id}, "created_at", ASCENDING, limit, cursor, response, model_projection(Message))
+    return json_response(messages, response)
+
+@api_router.get("/conversations/{conversation_id}/sync", response_model=MessageSync)
+async def sync_messages(
+    conversation_id: str,
+    since: Optional[str] = None,
+    after_id: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
+    await get_conversation_for_user(conversation_id, current_user)
+    base_query = {"conversation_id": conversation_id}
+    
+    if after_id and not since:
+        anchor = await db.messages.find_one({"conversation_id": conversation_id, "id": after_id}, {"_id": 0, "created_at": 1, "id": 1})
+        if not anchor:
+            raise HTTPException(status_code=404, detail="Message not found")
+        since = encode_cursor(anchor["created_at"], anchor["id"])
+    
+    if since:
+        # Delta: messages newer than the client's sync token, oldest first
+        messages = await db.messages.find(
+            keyset_query(base_query, "created_at", ASCENDING, since), {"_id": 0}
+        ).sort([("created_at", 1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+        sync_token = encode_cursor(messages[-1]["created_at"], messages[-1]["id"]) if messages else since
+        return {"messages": messages, "sync_token": sync_token, "has_more": has_more}
+    
+    # Latest page, or the page before ?before=, returned oldest first
     messages = await db.messages.find(
-        {"conversation_id": conversation_id},
-        {"_id": 0}
-    ).sort("created_at", 1).to_list(1000)
-    return messages
+        keyset_query(base_query, "created_at", DESCENDING, before), {"_id": 0}
+    ).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    before_cursor = encode_cursor(messages[-1]["created_at"], messages[-1]["id"]) if has_more else None
+    sync_token = None
+    if not before and messages:
+        sync_token = encode_cursor(messages[0]["created_at"], messages[0]["id"])
+    messages.reverse()
+    return {"messages": messages, "sync_token": sync_token, "before_cursor": before_cursor, "has_more": has_more}
 
 @api_router.post("/conversations/{conversation_id}/messages", response_model=Message)
 async def send_message(
@@ -561,32 +2858,156 @@ async def send_message(
     message_data: MessageCreate,
     current_user: User = Depends(get_current_user)
 ):
-    # Check access
-    conversation = await db.conversations.find_one({"id": conversation_id}, {"_id": 0})
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
+    conversation = await get_conversation_for_user(conversation_id, current_user)
     
-    if current_user.role != "admin" and current_user.id not in [conversation["candidate_id"], conversation["employer_id"]]:
-        raise HTTPException(status_code=403, detail="Not authorized")
+    return await post_message(conversation, current_user.id, current_user.name, message_data.message_text)
+
+@api_router.put("/conversations/{conversation_id}/read")
+async def mark_conversation_read(conversation_id: str, current_user: User = Depends(get_current_user)):
+    await get_conversation_for_user(conversation_id, current_user)
     
-    message = Message(
-        **message_data.model_dump(),
-        sender_id=current_user.id,
-        sender_name=current_user.name
+    await db.conversations.update_one(
+        {"id": conversation_id},
+        {"$set": {f"unread.{current_user.id}": 0}}
     )
-    await db.messages.insert_one(message.model_dump())
-    
-    return message
+    return {"message": "Conversation marked as read"}
+
+@api_router.websocket("/conversations/{conversation_id}/ws")
+async def conversation_socket(websocket: WebSocket, conversation_id: str, token: str):
+    # Browsers cannot set headers on WebSocket requests, so the JWT comes as ?token=
+    try:
+        current_user = await authenticate_token(token)
+        conversation = await get_conversation_for_user(conversation_id, current_user)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+    
+    await websocket.accept()
+    topic = conversation_topic(conversation_id)
+    subscription = pubsub.subscribe(topic)
+    
+    async def push():
+        while True:
+            payload = await subscription.get()
+            if payload is None:
+                # Fell too far behind; the client reconnects and catches up over HTTP
+                await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow")
+                return
+            await websocket.send_json(payload)
+    
+    async def receive():
+        while True:
+            data = await websocket.receive_json()
+            text = str(data.get("message_text", "")).strip() if isinstance(data, dict) else ""
+            if text:
+                await post_message(conversation, current_user.id, current_user.name, text)
+    
+    tasks = [asyncio.create_task(push()), asyncio.create_task(receive())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                logger.error(f"Conversation socket failed: {task.exception()}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        pubsub.unsubscribe(topic, subscription)
 
 # ==================== NOTIFICATIONS ====================
 
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_REPLAY_LIMIT = 100
+
+async def count_unread(user_id: str) -> int:
+    return await db.notifications.count_documents({"user_id": user_id, "read": False})
+
+async def publish_unread_count(user_id: str):
+    await pubsub.publish(notification_topic(user_id), {"type": "unread", "unread_count": await count_unread(user_id)})
+
+def sse_event(event: str, data: dict, event_id: Optional[str] = None) -> str:
+    lines = [f"id: {event_id}"] if event_id else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+async def notification_events(request: Request, user_id: str, resume_after: Optional[list]):
+    # Subscribe before replaying so nothing created in between is missed
+    topic = notification_topic(user_id)
+    subscription = pubsub.subscribe(topic)
+    try:
+        unread = await count_unread(user_id)
+        yield "retry: 3000\n\n"
+        yield sse_event("unread", {"unread_count": unread})
+        
+        sent = set()
+        if resume_after:
+            last_created_at, last_id = resume_after
+            missed = await db.notifications.find(
+                {"user_id": user_id, "$or": [
+                    {"created_at": {"$gt": last_created_at}},
+                    {"created_at": last_created_at, "id": {"$gt": last_id}}
+                ]},
+                {"_id": 0}
+            ).sort([("created_at", 1), ("id", 1)]).limit(SSE_REPLAY_LIMIT).to_list(SSE_REPLAY_LIMIT)
+            for notification in missed:
+                sent.add(notification["id"])
+                yield sse_event(
+                    "notification",
+                    {"notification": notification, "unread_count": unread},
+                    encode_cursor(notification["created_at"], notification["id"])
+                )
+        
+        while not await request.is_disconnected():
+            try:
+                payload = await asyncio.wait_for(subscription.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            if payload is None:
+                # Too far behind; the client reconnects with Last-Event-ID and replays
+                return
+            if payload["type"] == "unread":
+                unread = payload["unread_count"]
+                yield sse_event("unread", {"unread_count": unread})
+                continue
+            notification = payload["notification"]
+            if notification["id"] in sent:
+                continue
+            unread += 1
+            yield sse_event(
+                "notification",
+                {"notification": notification, "unread_count": unread},
+                encode_cursor(notification["created_at"], notification["id"])
+            )
+    finally:
+        pubsub.unsubscribe(topic, subscription)
+
+@api_router.get("/notifications/stream")
+async def stream_notifications(
+    request: Request,
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False))
+):
+    # EventSource cannot send headers, so the JWT may also come as ?token=
+    if credentials is None and token is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    current_user = await authenticate_token(credentials.credentials if credentials else token)
+    last_event_id = request.headers.get("last-event-id")
+    resume_after = decode_cursor(last_event_id, 2) if last_event_id else None
+    
+    return StreamingResponse(
+        notification_events(request, current_user.id, resume_after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.get("/notifications", response_model=List[Notification])
 async def get_notifications(current_user: User = Depends(get_current_user)):
     notifications = await db.notifications.find(
         {"user_id": current_user.id},
-        {"_id": 0}
+        model_projection(Notification)
     ).sort("created_at", -1).to_list(100)
-    return notifications
+    return json_response(notifications)
 
 @api_router.put("/notifications/{notif_id}/read")
 async def mark_notification_read(notif_id: str, current_user: User = Depends(get_current_user)):
@@ -594,6 +3015,7 @@ async def mark_notification_read(notif_id: str, current_user: User = Depends(get
         {"id": notif_id, "user_id": current_user.id},
         {"$set": {"read": True}}
     )
+    await publish_unread_count(current_user.id)
     return {"message": "Notification marked as read"}
 
 @api_router.put("/notifications/read-all")
@@ -602,41 +3024,127 @@ async def mark_all_notifications_read(current_user: User = Depends(get_current_u
         {"user_id": current_user.id},
         {"$set": {"read": True}}
     )
+    await publish_unread_count(current_user.id)
     return {"message": "All notifications marked as read"}
 
 # ==================== ADMIN ROUTES ====================
 
+# Served from a short-lived snapshot; once stale, the old snapshot is returned
+# while a single background refresh recomputes it
+ADMIN_STATS_TTL = float(os.environ.get('ADMIN_STATS_TTL', '30'))
+admin_stats_snapshot = {"value": None, "computed_at": 0.0, "refresh": None}
+
+async def count_by(collection, field: str, match: Optional[dict] = None) -> Dict[str, int]:
+    pipeline = [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}]
+    if match:
+        pipeline.insert(0, {"$match": match})
+    rows = await collection.aggregate(pipeline).to_list(None)
+    return {row["_id"]: row["count"] for row in rows}
+
+async def compute_admin_stats() -> dict:
+    roles, job_statuses, application_statuses = await asyncio.gather(
+        count_by(db.users, "role"),
+        count_by(db.jobs, "status"),
+        count_by(db.applications, "status")
+    )
+    stats = {
+        "total_users": sum(roles.values()),
+        "total_jobs": sum(job_statuses.values()),
+        "active_jobs": job_statuses.get("active", 0),
+        "total_applications": sum(application_statuses.values()),
+        "pending_applications": application_statuses.get("pending", 0),
+        "employers": roles.get("employer", 0),
+        "job_seekers": roles.get("job_seeker", 0)
+    }
+    admin_stats_snapshot["value"] = stats
+    admin_stats_snapshot["computed_at"] = time.monotonic()
+    return stats
+
+async def refresh_admin_stats():
+    try:
+        await compute_admin_stats()
+    except Exception as e:
+        logger.error(f"Admin stats refresh failed: {e}")
+    finally:
+        admin_stats_snapshot["refresh"] = None
+
 @api_router.get("/admin/stats")
 async def get_admin_stats(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     
-    total_users = await db.users.count_documents({})
-    total_jobs = await db.jobs.count_documents({})
-    active_jobs = await db.jobs.count_documents({"status": "active"})
-    total_applications = await db.applications.count_documents({})
-    pending_applications = await db.applications.count_documents({"status": "pending"})
+    if admin_stats_snapshot["value"] is None:
+        return await compute_admin_stats()
+    
+    if time.monotonic() - admin_stats_snapshot["computed_at"] > ADMIN_STATS_TTL and admin_stats_snapshot["refresh"] is None:
+        admin_stats_snapshot["refresh"] = asyncio.create_task(refresh_admin_stats())
+    return admin_stats_snapshot["value"]
+
+@api_router.get("/admin/users", response_model=List[User])
+async def get_all_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Depends(page_limit),
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    users = await paginate(db.users, {}, "created_at", DESCENDING, limit, cursor, response, model_projection(User))
+    return json_response(users, response)
+
+@api_router.get("/admin/indexes")
+async def get_admin_indexes(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    return await get_index_report()
+
+@api_router.get("/admin/outbox/dead")
+async def get_dead_letters(limit: int = Depends(page_limit), current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    
+    events = await db.outbox.find({"status": "dead"}, {"_id": 0}).sort("available_at", 1).to_list(limit)
+    return jsonable_encoder(events)
+
+@api_router.post("/admin/outbox/dead/retry")
+async def retry_dead_letters(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
     
-    employers = await db.users.count_documents({"role": "employer"})
-    job_seekers = await db.users.count_documents({"role": "job_seeker"})
+    result = await db.outbox.update_many(
+        {"status": "dead"},
+        {"$set": {"status": "pending", "attempts": 0, "available_at": datetime.now(timezone.utc)}}
+    )
+    outbox_wakeup.set()
+    return {"message": f"Requeued {result.modified_count} events"}
+
+@api_router.get("/admin/metrics")
+async def get_admin_metrics(current_user: User = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
     
     return {
-        "total_users": total_users,
-        "total_jobs": total_jobs,
-        "active_jobs": active_jobs,
-        "total_applications": total_applications,
-        "pending_applications": pending_applications,
-        "employers": employers,
-        "job_seekers": job_seekers
+        "auth_token_cache": token_cache.stats(),
+        "auth_user_cache": user_cache.stats(),
+        "password_hashing": password_stats(),
+        "invoice_cache": invoice_cache.stats(),
+        "job_listing_cache": job_listing_cache.stats(),
+        "job_facet_cache": job_facet_cache.stats(),
+        "applicant_ranking_cache": applicant_ranking_cache.stats(),
+        "invoice_render": invoice_render_stats.stats(),
+        "pubsub": pubsub.stats(),
+        "outbox": await outbox_stats()
     }
 
-@api_router.get("/admin/users", response_model=List[User])
-async def get_all_users(current_user: User = Depends(get_current_user)):
+@api_router.post("/admin/ratings/rebuild")
+async def rebuild_ratings(user_id: Optional[str] = None, current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin only")
     
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(1000)
-    return users
+    await rebuild_rating_aggregates(user_id)
+    return {"message": "Rating aggregates rebuilt"}
 
 @api_router.delete("/admin/users/{user_id}")
 async def delete_user(user_id: str, current_user: User = Depends(get_current_user)):
@@ -644,28 +3152,40 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=403, detail="Admin only")
     
     await db.users.delete_one({"id": user_id})
+    invalidate_user(user_id)
     return {"message": "User deleted successfully"}
 
 # ==================== REPORTS & INVOICES ====================
 
-@api_router.get("/reports/invoice/{application_id}")
-async def generate_invoice(application_id: str, current_user: User = Depends(get_current_user)):
-    # Get application details
-    application = await db.applications.find_one({"id": application_id}, {"_id": 0})
-    if not application:
-        raise HTTPException(status_code=404, detail="Application not found")
-    
-    if application["status"] != "accepted" and application["status"] != "completed":
-        raise HTTPException(status_code=400, detail="Invoice only for accepted/completed jobs")
-    
-    # Get job details
-    job = await db.jobs.find_one({"id": application["job_id"]}, {"_id": 0})
-    
-    # Get user details
-    applicant = await db.users.find_one({"id": application["applicant_id"]}, {"_id": 0})
-    employer = await db.users.find_one({"id": application["employer_id"]}, {"_id": 0})
-    
-    # Create PDF
+# PDFs are rendered in worker processes and cached by a hash of everything
+# printed on them, so a repeat download is a cache hit or a 304.
+INVOICE_RENDER_WORKERS = int(os.environ.get('INVOICE_RENDER_WORKERS', '2'))
+INVOICE_CACHE_MAX_BYTES = int(os.environ.get('INVOICE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+# Spawned rather than forked: forking a process that already runs Motor and event-loop threads is unsafe
+invoice_executor = ProcessPoolExecutor(max_workers=INVOICE_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+invoice_cache = ByteLRUCache(INVOICE_CACHE_MAX_BYTES)  # etag -> (pdf bytes, issued datetime)
+invoice_render_stats = LatencyStats()
+
+def invoice_fields(application: dict, job: dict, applicant: dict) -> dict:
+    return {
+        "application_id": application["id"],
+        "status": application["status"],
+        "title": job["title"],
+        "company_name": job["company_name"],
+        "duration_value": job["duration_value"],
+        "location": job["location"],
+        "salary": job["salary"],
+        "name": applicant["name"],
+        "email": applicant["email"],
+        "phone": applicant.get("phone", "N/A")
+    }
+
+def invoice_etag(fields: dict) -> str:
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+def render_invoice_pdf(fields: dict, issued_date: str) -> bytes:
+    # Runs in a worker process; takes and returns only picklable values
     buffer = BytesIO()
     p = canvas.Canvas(buffer, pagesize=A4)
     width, height = A4
@@ -675,32 +3195,32 @@ async def generate_invoice(application_id: str, current_user: User = Depends(get
     p.drawString(2*cm, height - 3*cm, "JOBNI - Invoice")
     
     p.setFont("Helvetica", 12)
-    p.drawString(2*cm, height - 4*cm, f"Invoice Date: {datetime.now().strftime('%Y-%m-%d')}")
-    p.drawString(2*cm, height - 4.5*cm, f"Application ID: {application_id}")
+    p.drawString(2*cm, height - 4*cm, f"Invoice Date: {issued_date}")
+    p.drawString(2*cm, height - 4.5*cm, f"Application ID: {fields['application_id']}")
     
     # Job Details
     p.setFont("Helvetica-Bold", 14)
     p.drawString(2*cm, height - 6*cm, "Job Details:")
     p.setFont("Helvetica", 12)
-    p.drawString(2*cm, height - 6.7*cm, f"Title: {job['title']}")
-    p.drawString(2*cm, height - 7.3*cm, f"Company: {job['company_name']}")
-    p.drawString(2*cm, height - 7.9*cm, f"Duration: {job['duration_value']}")
-    p.drawString(2*cm, height - 8.5*cm, f"Location: {job['location']}")
+    p.drawString(2*cm, height - 6.7*cm, f"Title: {fields['title']}")
+    p.drawString(2*cm, height - 7.3*cm, f"Company: {fields['company_name']}")
+    p.drawString(2*cm, height - 7.9*cm, f"Duration: {fields['duration_value']}")
+    p.drawString(2*cm, height - 8.5*cm, f"Location: {fields['location']}")
     
     # Worker Details
     p.setFont("Helvetica-Bold", 14)
     p.drawString(2*cm, height - 10*cm, "Worker Details:")
     p.setFont("Helvetica", 12)
-    p.drawString(2*cm, height - 10.7*cm, f"Name: {applicant['name']}")
-    p.drawString(2*cm, height - 11.3*cm, f"Email: {applicant['email']}")
-    p.drawString(2*cm, height - 11.9*cm, f"Phone: {applicant.get('phone', 'N/A')}")
+    p.drawString(2*cm, height - 10.7*cm, f"Name: {fields['name']}")
+    p.drawString(2*cm, height - 11.3*cm, f"Email: {fields['email']}")
+    p.drawString(2*cm, height - 11.9*cm, f"Phone: {fields['phone']}")
     
     # Payment Details
     p.setFont("Helvetica-Bold", 14)
     p.drawString(2*cm, height - 13.5*cm, "Payment Details:")
     p.setFont("Helvetica", 12)
-    p.drawString(2*cm, height - 14.2*cm, f"Amount: {job['salary']} SAR")
-    p.drawString(2*cm, height - 14.8*cm, f"Status: {application['status'].upper()}")
+    p.drawString(2*cm, height - 14.2*cm, f"Amount: {fields['salary']} SAR")
+    p.drawString(2*cm, height - 14.8*cm, f"Status: {fields['status'].upper()}")
     
     # Footer
     p.setFont("Helvetica", 10)
@@ -709,52 +3229,283 @@ async def generate_invoice(application_id: str, current_user: User = Depends(get
     
     p.showPage()
     p.save()
+    return buffer.getvalue()
+
+async def get_invoice_pdf(fields: dict):
+    # Returns (etag, pdf bytes, issued datetime), rendering only on a cache miss
+    etag = invoice_etag(fields)
+    cached = invoice_cache.get(etag)
+    if cached is not None:
+        return etag, cached[0], cached[1]
+    issued = datetime.now(timezone.utc).replace(microsecond=0)
+    start = time.perf_counter()
+    pdf = await asyncio.get_running_loop().run_in_executor(
+        invoice_executor, render_invoice_pdf, fields, issued.strftime('%Y-%m-%d')
+    )
+    invoice_render_stats.observe(time.perf_counter() - start)
+    invoice_cache.set(etag, (pdf, issued), len(pdf))
+    return etag, pdf, issued
+
+@api_router.get("/reports/invoice/{application_id}")
+async def generate_invoice(application_id: str, request: Request, current_user: User = Depends(get_current_user)):
+    # Get application details
+    application = await db.applications.find_one({"id": application_id}, {"_id": 0})
+    if not application:
+        raise HTTPException(status_code=404, detail="Application not found")
+    
+    if application["status"] != "accepted" and application["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Invoice only for accepted/completed jobs")
+    
+    # Get job and worker details
+    job, applicant = await asyncio.gather(
+        db.jobs.find_one({"id": application["job_id"]}, {"_id": 0}),
+        db.users.find_one({"id": application["applicant_id"]}, {"_id": 0, "password": 0})
+    )
+    
+    # The ETag depends only on the printed fields, so a matching If-None-Match
+    # is answered without rendering, even when this worker has no cached copy
+    fields = invoice_fields(application, job, applicant)
+    etag = invoice_etag(fields)
+    if not_modified(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    
+    etag, pdf, issued = await get_invoice_pdf(fields)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(issued, usegmt=True),
+        "Cache-Control": "private, no-cache"
+    }
+    if not_modified(request, etag, issued):
+        return Response(status_code=304, headers=headers)
+    
+    headers["Content-Disposition"] = f"attachment; filename=invoice_{application_id}.pdf"
+    return Response(content=pdf, media_type="application/pdf", headers=headers)
+
+# Bulk export renders invoices in windows of INVOICE_EXPORT_WINDOW and writes
+# each ZIP entry as soon as its PDF is ready, so memory stays bounded by the window
+INVOICE_EXPORT_WINDOW = int(os.environ.get('INVOICE_EXPORT_WINDOW', str(INVOICE_RENDER_WORKERS * 4)))
+
+class ZipStream:
+    """Write-only file object that hands each chunk ZipFile writes back to the response."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def invoice_zip_chunks(query: dict):
+    stream = ZipStream()
+    # No tell()/seek() on the stream, so ZipFile writes data descriptors and never rewinds
+    archive = zipfile.ZipFile(stream, mode="w", compression=zipfile.ZIP_STORED)
+    cursor = db.applications.find(query, {"_id": 0}).sort([("applied_date", 1), ("id", 1)]).batch_size(INVOICE_EXPORT_WINDOW)
+    pending = set()
+    try:
+        batch = []
+        async for application in cursor:
+            batch.append(application)
+            if len(batch) < INVOICE_EXPORT_WINDOW:
+                continue
+            pending = await start_invoice_renders(batch)
+            batch = []
+            async for chunk in write_invoice_entries(archive, stream, pending):
+                yield chunk
+        if batch:
+            pending = await start_invoice_renders(batch)
+            async for chunk in write_invoice_entries(archive, stream, pending):
+                yield chunk
+        archive.close()
+        yield stream.drain()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def start_invoice_renders(applications: list) -> set:
+    jobs, applicants = await asyncio.gather(
+        db.jobs.find({"id": {"$in": list({a["job_id"] for a in applications})}}, {"_id": 0}).to_list(None),
+        db.users.find({"id": {"$in": list({a["applicant_id"] for a in applications})}}, {"_id": 0, "password": 0}).to_list(None)
+    )
+    jobs = {job["id"]: job for job in jobs}
+    applicants = {user["id"]: user for user in applicants}
+    
+    async def render(application):
+        _, pdf, issued = await get_invoice_pdf(
+            invoice_fields(application, jobs[application["job_id"]], applicants[application["applicant_id"]])
+        )
+        return application["id"], pdf, issued
+    
+    return {
+        asyncio.create_task(render(a))
+        for a in applications
+        if a["job_id"] in jobs and a["applicant_id"] in applicants
+    }
+
+async def write_invoice_entries(archive: zipfile.ZipFile, stream: ZipStream, pending: set):
+    for finished in asyncio.as_completed(pending):
+        application_id, pdf, issued = await finished
+        info = zipfile.ZipInfo(f"invoice_{application_id}.pdf", date_time=issued.timetuple()[:6])
+        archive.writestr(info, pdf)
+        yield stream.drain()
+
+@api_router.get("/reports/invoices/export")
+async def export_invoices(
+    job_id: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if current_user.role not in ["employer", "admin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    query = {"status": {"$in": ["accepted", "completed"]}}
+    if current_user.role == "employer":
+        query["employer_id"] = current_user.id
+    if job_id:
+        query["job_id"] = job_id
+    if date_from or date_to:
+        query["applied_date"] = {}
+        if date_from:
+            query["applied_date"]["$gte"] = date_from.isoformat()
+        if date_to:
+            query["applied_date"]["$lt"] = (date_to + timedelta(days=1)).isoformat()
+    
+    filename = f"invoices_{datetime.now(timezone.utc).strftime('%Y%m%d')}.zip"
+    return StreamingResponse(invoice_zip_chunks(query), media_type="application/zip", headers={
+        "Content-Disposition": f"attachment; filename={filename}"
+    })
+
+# Exports walk a MongoDB cursor in EXPORT_BATCH_SIZE batches and flush each
+# batch of encoded rows to the client, so memory stays flat however many rows match.
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+EXPORTS = {  # resource -> (collection, model, date field, owner field for employers; None means admin only)
+    "jobs": ("jobs", Job, "posted_date", "employer_id"),
+    "applications": ("applications", Application, "applied_date", "employer_id"),
+    "users": ("users", User, "created_at", None),
+}
+
+def export_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        # Same separator the bulk job import reads back
+        return BULK_LIST_SEPARATOR.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+async def export_chunks(cursor, fields: List[str], format: str):
+    if format == "ndjson":
+        lines = []
+        async for doc in cursor:
+            lines.append(dump_json(doc))
+            if len(lines) == EXPORT_BATCH_SIZE:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+        return
+    
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")  # lets spreadsheet apps detect UTF-8 Arabic text
+    writer.writerow(fields)
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([export_cell(doc.get(field)) for field in fields])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+@api_router.get("/reports/export/{resource}")
+async def export_resource(
+    resource: str,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    fields: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: User = Depends(get_current_user)
+):
+    if resource not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown export")
+    collection_name, model, date_field, owner_field = EXPORTS[resource]
+    if current_user.role != "admin" and (current_user.role != "employer" or owner_field is None):
+        raise HTTPException(status_code=403, detail="Not authorized")
+    
+    selected = [field.strip() for field in fields.split(",") if field.strip()] if fields else list(model.model_fields)
+    unknown = [field for field in selected if field not in model.model_fields]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields selected")
     
-    buffer.seek(0)
-    return StreamingResponse(buffer, media_type="application/pdf", headers={
-        "Content-Disposition": f"attachment; filename=invoice_{application_id}.pdf"
+    query = {}
+    if current_user.role == "employer":
+        query[owner_field] = current_user.id
+    if date_from or date_to:
+        query[date_field] = {}
+        if date_from:
+            query[date_field]["$gte"] = date_from.isoformat()
+        if date_to:
+            query[date_field]["$lt"] = (date_to + timedelta(days=1)).isoformat()
+    
+    cursor = db[collection_name].find(
+        query, {**{field: 1 for field in selected}, "_id": 0}, batch_size=EXPORT_BATCH_SIZE
+    ).sort([(date_field, ASCENDING), ("id", ASCENDING)])
+    
+    filename = f"{resource}_{datetime.now(timezone.utc).strftime('%Y%m%d')}.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(export_chunks(cursor, selected, format), media_type=media_type, headers={
+        "Content-Disposition": f"attachment; filename={filename}"
     })
 
 @api_router.get("/reports/stats")
 async def get_user_stats(current_user: User = Depends(get_current_user)):
     if current_user.role == "employer":
-        total_jobs = await db.jobs.count_documents({"employer_id": current_user.id})
-        active_jobs = await db.jobs.count_documents({"employer_id": current_user.id, "status": "active"})
-        total_applications = await db.applications.count_documents({"employer_id": current_user.id})
-        pending = await db.applications.count_documents({"employer_id": current_user.id, "status": "pending"})
-        accepted = await db.applications.count_documents({"employer_id": current_user.id, "status": "accepted"})
+        job_statuses, application_statuses = await asyncio.gather(
+            count_by(db.jobs, "status", {"employer_id": current_user.id}),
+            count_by(db.applications, "status", {"employer_id": current_user.id})
+        )
         
         return {
-            "total_jobs": total_jobs,
-            "active_jobs": active_jobs,
-            "total_applications": total_applications,
-            "pending_applications": pending,
-            "accepted_applications": accepted
+            "total_jobs": sum(job_statuses.values()),
+            "active_jobs": job_statuses.get("active", 0),
+            "total_applications": sum(application_statuses.values()),
+            "pending_applications": application_statuses.get("pending", 0),
+            "accepted_applications": application_statuses.get("accepted", 0)
         }
     elif current_user.role == "job_seeker":
-        total_applications = await db.applications.count_documents({"applicant_id": current_user.id})
-        pending = await db.applications.count_documents({"applicant_id": current_user.id, "status": "pending"})
-        accepted = await db.applications.count_documents({"applicant_id": current_user.id, "status": "accepted"})
-        completed = await db.applications.count_documents({"applicant_id": current_user.id, "status": "completed"})
-        
-        # Calculate total earnings
-        accepted_apps = await db.applications.find({
-            "applicant_id": current_user.id,
-            "status": {"$in": ["accepted", "completed"]}
-        }, {"_id": 0}).to_list(1000)
-        
-        total_earnings = 0
-        for app in accepted_apps:
-            job = await db.jobs.find_one({"id": app["job_id"]}, {"_id": 0})
-            if job:
-                total_earnings += job["salary"]
+        # Status counts and earnings (salary of accepted/completed jobs) in one round trip
+        pipeline = [
+            {"$match": {"applicant_id": current_user.id}},
+            {"$facet": {
+                "by_status": [{"$group": {"_id": "$status", "count": {"$sum": 1}}}],
+                "earnings": [
+                    {"$match": {"status": {"$in": ["accepted", "completed"]}}},
+                    {"$lookup": {"from": "jobs", "localField": "job_id", "foreignField": "id", "as": "job"}},
+                    {"$unwind": "$job"},
+                    {"$group": {"_id": None, "total": {"$sum": "$job.salary"}}}
+                ]
+            }}
+        ]
+        result = (await db.applications.aggregate(pipeline).to_list(1))[0]
+        statuses = {row["_id"]: row["count"] for row in result["by_status"]}
         
         return {
-            "total_applications": total_applications,
-            "pending_applications": pending,
-            "accepted_applications": accepted,
-            "completed_jobs": completed,
-            "total_earnings": total_earnings
+            "total_applications": sum(statuses.values()),
+            "pending_applications": statuses.get("pending", 0),
+            "accepted_applications": statuses.get("accepted", 0),
+            "completed_jobs": statuses.get("completed", 0),
+            "total_earnings": result["earnings"][0]["total"] if result["earnings"] else 0
         }
     
     return {}
@@ -762,12 +3513,15 @@ async def get_user_stats(current_user: User = Depends(get_current_user)):
 # Include router
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 logging.basicConfig(
@@ -776,6 +3530,40 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Versioned data migrations, applied once each in order: (version, description, coroutine function)
+MIGRATIONS = [
+    (1, "Backfill incremental rating aggregates", rebuild_rating_aggregates),
+    (2, "Backfill conversation summaries", backfill_conversation_summaries),
+    (3, "Geocode existing jobs", backfill_job_geocodes),
+]
+
+background_tasks = []
+
+@app.on_event("startup")
+async def startup_migrations():
+    await run_migrations()
+    await pubsub.start()
+    await rebuild_search_index()
+    await rebuild_recommender()
+    background_tasks.append(asyncio.create_task(refresh_job_indexes_periodically()))
+    background_tasks.append(asyncio.create_task(flush_views_periodically()))
+    background_tasks.append(asyncio.create_task(run_outbox_worker()))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await flush_views()
+    await pubsub.stop()
     client.close()
+    password_executor.shutdown(wait=False)
+    invoice_executor.shutdown(wait=False)
+
+if __name__ == "__main__":
+    # Maintenance commands, e.g. `python server.py rebuild-ratings [user_id]`
+    import sys
+    commands = {"rebuild-ratings": rebuild_rating_aggregates, "migrate": run_migrations}
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        sys.exit(f"usage: python server.py {{{'|'.join(commands)}}} [args]")
+    asyncio.run(commands[sys.argv[1]](*sys.argv[2:]))
@@ -0,0 +1,8 @@
+import axios from 'axios';
+
+// List endpoints return one page as a plain array; the cursor for the next
+// page comes back in the X-Next-Cursor header and is absent on the last page.
+export async function fetchPage(url, params = {}, cursor = null) {
+  const response = await axios.get(url, { params: cursor ? { ...params, cursor } : params });
+  return { items: response.data, nextCursor: response.headers['x-next-cursor'] || null };
+}
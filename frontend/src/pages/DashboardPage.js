@@ -11,6 +11,7 @@ import { Textarea } from '../components/ui/textarea';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '../components/ui/select';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchPage } from '../lib/pagination';
 import { Briefcase, Clock, Users, TrendingUp, Plus, Check, X, Download, Home, LogOut, Edit, Trash2 } from 'lucide-react';
 import './DashboardPage.css';
 
@@ -19,8 +20,10 @@ const DashboardPage = () => {
   const navigate = useNavigate();
   const [stats, setStats] = useState(null);
   const [applications, setApplications] = useState([]);
+  const [applicationsCursor, setApplicationsCursor] = useState(null);
   const [jobs, setJobs] = useState([]);
-  const [allUsers, setAllUsers] = useState([]);
+  const [jobsCursor, setJobsCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showCreateJob, setShowCreateJob] = useState(false);
   const [loading, setLoading] = useState(true);
   const [editingJobId, setEditingJobId] = useState(null);
@@ -40,6 +43,40 @@ const DashboardPage = () => {
     fetchData();
   }, [user?.role]);
 
+  const jobsParams = () => (user.role === 'employer' ? { employer_id: user.id } : {});
+
+  // Applications come back with their job and applicant summaries already joined
+  const withSummaryNames = (app) => ({
+    ...app,
+    jobTitle: app.job?.title,
+    applicantName: app.applicant?.name || 'غير معروف'
+  });
+
+  const loadMore = async (url, params, cursor, append, setCursor) => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(url, params, cursor);
+      append(page.items);
+      setCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('فشل تحميل البيانات');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const loadMoreApplications = () => loadMore(
+    `${API}/applications/hydrated`, {}, applicationsCursor,
+    items => setApplications(current => [...current, ...items.map(withSummaryNames)]),
+    setApplicationsCursor
+  );
+
+  const loadMoreJobs = () => loadMore(
+    `${API}/jobs`, jobsParams(), jobsCursor,
+    items => setJobs(current => [...current, ...items]),
+    setJobsCursor
+  );
+
   const fetchData = async () => {
     try {
       const statsResponse = await axios.get(`${API}/reports/stats`);
@@ -48,39 +85,16 @@ const DashboardPage = () => {
       if (user.role === 'admin') {
         const adminStatsResponse = await axios.get(`${API}/admin/stats`);
         setStats(adminStatsResponse.data);
-        
-        const jobsResponse = await axios.get(`${API}/jobs`);
-        setJobs(jobsResponse.data);
-        
-        const usersResponse = await axios.get(`${API}/admin/users`);
-        setAllUsers(usersResponse.data);
-      } else if (user.role === 'employer') {
-        const jobsResponse = await axios.get(`${API}/jobs`);
-        setJobs(jobsResponse.data.filter(j => j.employer_id === user.id));
+      }
+      if (user.role === 'admin' || user.role === 'employer') {
+        const jobsPage = await fetchPage(`${API}/jobs`, jobsParams());
+        setJobs(jobsPage.items);
+        setJobsCursor(jobsPage.nextCursor);
       }
 
-      const appsResponse = await axios.get(`${API}/applications`);
-      setApplications(appsResponse.data);
-      
-      // Fetch applicant and job details for each application
-      const enrichedApps = await Promise.all(
-        appsResponse.data.map(async (app) => {
-          try {
-            const [jobRes, applicantRes] = await Promise.all([
-              axios.get(`${API}/jobs/${app.job_id}`),
-              axios.get(`${API}/admin/users`).then(res => res.data.find(u => u.id === app.applicant_id))
-            ]);
-            return {
-              ...app,
-              jobTitle: jobRes.data.title,
-              applicantName: applicantRes?.name || 'غير معروف'
-            };
-          } catch (err) {
-            return app;
-          }
-        })
-      );
-      setApplications(enrichedApps);
+      const appsPage = await fetchPage(`${API}/applications/hydrated`);
+      setApplications(appsPage.items.map(withSummaryNames));
+      setApplicationsCursor(appsPage.nextCursor);
     } catch (error) {
       toast.error('فشل تحميل البيانات');
     } finally {
@@ -282,6 +296,13 @@ const DashboardPage = () => {
                 ))}
               </div>
             )}
+            {applicationsCursor && (
+              <div className="load-more">
+                <Button variant="outline" onClick={loadMoreApplications} disabled={loadingMore} data-testid="load-more-applications">
+                  عرض المزيد
+                </Button>
+              </div>
+            )}
           </CardContent>
         </Card>
 
@@ -345,6 +366,13 @@ const DashboardPage = () => {
                   ))}
                 </div>
               )}
+              {jobsCursor && (
+                <div className="load-more">
+                  <Button variant="outline" onClick={loadMoreJobs} disabled={loadingMore} data-testid="load-more-jobs">
+                    عرض المزيد
+                  </Button>
+                </div>
+              )}
             </CardContent>
           </Card>
         )}
@@ -7,6 +7,7 @@ import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '.
 import { Badge } from '../components/ui/badge';
 import { toast } from 'sonner';
 import axios from 'axios';
+import { fetchPage } from '../lib/pagination';
 import { Search, MapPin, Clock, DollarSign, Heart, Briefcase, Menu, X, User, LogOut } from 'lucide-react';
 import './JobsPage.css';
 
@@ -16,6 +17,10 @@ const JobsPage = () => {
   const [jobs, setJobs] = useState([]);
   const [savedJobs, setSavedJobs] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [facets, setFacets] = useState(null);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [pageParams, setPageParams] = useState({});
+  const [loadingMore, setLoadingMore] = useState(false);
   const [filters, setFilters] = useState({
     search: '',
     category: 'all',
@@ -31,16 +36,26 @@ const JobsPage = () => {
     }
   }, []);
 
+  const filterParams = () => {
+    const params = {};
+    if (filters.category !== 'all') params.category = filters.category;
+    if (filters.duration_type !== 'all') params.duration_type = filters.duration_type;
+    if (filters.location) params.location = filters.location;
+    if (filters.search) params.search = filters.search;
+    return params;
+  };
+
   const fetchJobs = async () => {
     try {
-      const params = new URLSearchParams();
-      if (filters.category !== 'all') params.append('category', filters.category);
-      if (filters.duration_type !== 'all') params.append('duration_type', filters.duration_type);
-      if (filters.location) params.append('location', filters.location);
-      if (filters.search) params.append('search', filters.search);
-      
-      const response = await axios.get(`${API}/jobs?${params.toString()}`);
-      setJobs(response.data);
+      const params = filterParams();
+      const [page, facetsResponse] = await Promise.all([
+        fetchPage(`${API}/jobs`, params),
+        axios.get(`${API}/jobs/facets`, { params })
+      ]);
+      setJobs(page.items);
+      setNextCursor(page.nextCursor);
+      setPageParams(params);
+      setFacets(facetsResponse.data);
     } catch (error) {
       toast.error('فشل تحميل الوظائف');
     } finally {
@@ -48,6 +63,19 @@ const JobsPage = () => {
     }
   };
 
+  const loadMoreJobs = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(`${API}/jobs`, pageParams, nextCursor);
+      setJobs(current => [...current, ...page.items]);
+      setNextCursor(page.nextCursor);
+    } catch (error) {
+      toast.error('فشل تحميل الوظائف');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const fetchSavedJobs = async () => {
     try {
       const response = await axios.get(`${API}/saved-jobs`);
@@ -104,6 +132,16 @@ const JobsPage = () => {
     { value: 'month', label: 'شهر' },
   ];
 
+  const facetLabel = (facet, option) => {
+    if (!facets) return option.label;
+    if (option.value === 'all') {
+      const total = facets[facet].reduce((sum, entry) => sum + entry.count, 0);
+      return `${option.label} (${total})`;
+    }
+    const entry = facets[facet].find(item => item.value === option.value);
+    return `${option.label} (${entry ? entry.count : 0})`;
+  };
+
   return (
     <div className="jobs-page" data-testid="jobs-page">
       {/* Header */}
@@ -154,7 +192,7 @@ const JobsPage = () => {
               </SelectTrigger>
               <SelectContent style={{ position: 'relative', zIndex: 9999 }}>
                 {categories.map(cat => (
-                  <SelectItem key={cat.value} value={cat.value}>{cat.label}</SelectItem>
+                  <SelectItem key={cat.value} value={cat.value}>{facetLabel('category', cat)}</SelectItem>
                 ))}
               </SelectContent>
             </Select>
@@ -165,7 +203,7 @@ const JobsPage = () => {
               </SelectTrigger>
               <SelectContent>
                 {durations.map(dur => (
-                  <SelectItem key={dur.value} value={dur.value}>{dur.label}</SelectItem>
+                  <SelectItem key={dur.value} value={dur.value}>{facetLabel('duration_type', dur)}</SelectItem>
                 ))}
               </SelectContent>
             </Select>
@@ -190,7 +228,7 @@ const JobsPage = () => {
         <div className="container">
           <div className="section-header">
             <h2>الوظائف المتاحة</h2>
-            <Badge variant="secondary">{jobs.length} وظيفة</Badge>
+            <Badge variant="secondary">{facets ? facets.total : jobs.length} وظيفة</Badge>
           </div>
 
           {loading ? (
@@ -249,6 +287,14 @@ const JobsPage = () => {
               ))}
             </div>
           )}
+
+          {!loading && nextCursor && (
+            <div className="load-more">
+              <Button variant="outline" onClick={loadMoreJobs} disabled={loadingMore} data-testid="load-more-jobs">
+                {loadingMore ? 'جاري التحميل...' : 'عرض المزيد'}
+              </Button>
+            </div>
+          )}
         </div>
       </section>
     </div>
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Compares the old response path (response_model validation + jsonable_encoder +
+# json.dumps) with the trusted orjson path, plus gzip/brotli cost and size.
+# Usage: python scripts/bench_serialization.py [items]
+import sys
+import os
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+# server.py reads these at import time; nothing connects until a query runs
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'bench')
+
+import gzip
+import json
+import timeit
+import uuid
+from datetime import datetime, timezone
+from typing import List
+from pydantic import TypeAdapter
+from fastapi.encoders import jsonable_encoder
+
+import server
+
+def make_jobs(count):
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "title": f"كاشير في مطعم {i}",
+            "description": "نبحث عن كاشير للعمل بدوام جزئي في فرع الرياض. " * 4,
+            "company_name": "شركة التقنية الحديثة",
+            "location": "الرياض",
+            "duration_type": "hours_8",
+            "duration_value": "8 ساعات",
+            "salary": 250.0 + i,
+            "category": "التجزئة",
+            "requirements": ["خبرة في الكاشير", "مهارات تواصل"],
+            "deadline": None,
+            "employer_id": str(uuid.uuid4()),
+            "status": "active",
+            "posted_date": datetime.now(timezone.utc).isoformat(),
+            "views": i
+        }
+        for i in range(count)
+    ]
+
+def bench(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<40} {seconds * 1000:9.3f} ms")
+    return seconds
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    docs = make_jobs(count)
+    adapter = TypeAdapter(List[server.Job])
+    number = max(1, 20000 // count)
+    print(f"{count} jobs, orjson {'available' if server.orjson else 'missing'}, "
+          f"brotli {'available' if server.brotli else 'missing'}\n")
+
+    def current_path():
+        return json.dumps(jsonable_encoder(adapter.validate_python(docs)), ensure_ascii=False).encode()
+
+    def fast_path():
+        return server.dump_json(docs)
+
+    baseline = bench("validate + jsonable_encoder + json", current_path, number)
+    fast = bench("trusted projection + dump_json", fast_path, number)
+    print(f"{'speedup':<40} {baseline / fast:9.1f}x\n")
+
+    body = fast_path()
+    print(f"{'uncompressed':<40} {len(body):9d} bytes")
+    bench("gzip level 6", lambda: gzip.compress(body, compresslevel=6), number)
+    print(f"{'gzip size':<40} {len(gzip.compress(body, compresslevel=6)):9d} bytes")
+    if server.brotli:
+        bench("brotli quality 4", lambda: server.brotli.compress(body, quality=4), number)
+        print(f"{'brotli size':<40} {len(server.brotli.compress(body, quality=4)):9d} bytes")
+
+if __name__ == "__main__":
+    main()
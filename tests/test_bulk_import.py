@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+async def byte_chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def read(records, data: str, size: int = 7):
+    async def collect():
+        return [record async for record in records(byte_chunks(data.encode(), size))]
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def small_records(monkeypatch):
+    monkeypatch.setattr(server, "BULK_MAX_RECORD_CHARS", 40)
+
+
+def test_unquoted_double_quote_is_literal():
+    rows = read(server.csv_records, 'title,description\nTV,5" screen\nRadio,portable\n')
+    assert rows == [(2, {"title": "TV", "description": '5" screen'}), (3, {"title": "Radio", "description": "portable"})]
+
+
+def test_quoted_field_spans_lines_and_keeps_escaped_quotes():
+    rows = read(server.csv_records, 'title,description\n"Cashier","first line\nsaid ""hi"""\nNext,row\n')
+    assert rows == [(2, {"title": "Cashier", "description": 'first line\nsaid "hi"'}), (4, {"title": "Next", "description": "row"})]
+
+
+def test_requirements_are_split_on_separator():
+    rows = read(server.csv_records, "title,requirements\nCook,food safety| hygiene |\n")
+    assert rows == [(2, {"title": "Cook", "requirements": ["food safety", "hygiene"]})]
+
+
+def test_unterminated_quote_at_eof_is_reported():
+    rows = read(server.csv_records, 'title,description\nA,"open\nB,c\n')
+    assert rows == [(2, "Unterminated quoted field")]
+
+
+def test_unterminated_quote_is_cut_off_at_record_limit(small_records):
+    data = 'title,description\nA,"open\n' + "".join(f"B{i},row\n" for i in range(10))
+    rows = read(server.csv_records, data)
+    assert rows[0][0] == 2 and rows[0][1].startswith("Record longer than 40 characters")
+    # reading resumes on the line after the one that crossed the limit
+    assert all(isinstance(record, dict) for _, record in rows[1:])
+    assert rows[-1] == (12, {"title": "B9", "description": "row"})
+
+
+def test_line_without_newline_is_bounded(small_records):
+    data = "title,description\n" + "x" * 1000 + "\nA,b\n" + "y" * 1000
+    rows = read(server.csv_records, data, size=16)
+    assert rows == [
+        (2, "Record longer than 40 characters"),
+        (3, {"title": "A", "description": "b"}),
+        (4, "Record longer than 40 characters")
+    ]
+
+
+def test_column_count_mismatch_is_reported():
+    rows = read(server.csv_records, "title,description\nonly\n")
+    assert rows == [(2, "Expected 2 columns, got 1")]
+
+
+def test_ndjson_reports_long_and_invalid_lines(small_records):
+    data = '{"title": "A"}\n' + "z" * 100 + '\nnot json\n[1]\n'
+    rows = read(server.ndjson_records, data)
+    assert rows[0] == (1, {"title": "A"})
+    assert rows[1] == (2, "Line longer than 40 characters")
+    assert rows[2][0] == 3 and rows[2][1].startswith("Invalid JSON")
+    assert rows[3] == (4, "Each line must be a JSON object")
@@ -0,0 +1,60 @@
+import asyncio
+import gzip
+
+from fastapi import Request, Response
+
+import server
+
+ETAG = '"listing"'
+BODY = b"[" + b"1," * 2000 + b"1]"
+
+
+async def listing(scope, receive, send):
+    if server.not_modified(Request(scope), ETAG):
+        response = Response(status_code=304, headers={"ETag": ETAG})
+    else:
+        response = Response(content=BODY, media_type="application/json", headers={"ETag": ETAG})
+    await response(scope, receive, send)
+
+
+def get(headers):
+    scope = {
+        "type": "http", "method": "GET", "path": "/listing",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(server.CompressionMiddleware(listing)(scope, receive, send))
+    start, body = messages
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body["body"]
+
+
+def test_compressed_body_gets_a_weak_etag():
+    status, headers, body = get({"Accept-Encoding": "gzip"})
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == BODY
+    assert headers["etag"] == f"W/{ETAG}"
+
+
+def test_identity_body_keeps_the_strong_etag():
+    status, headers, body = get({"Accept-Encoding": "identity"})
+    assert "content-encoding" not in headers
+    assert headers["etag"] == ETAG
+
+
+def test_weak_validator_revalidates_with_the_same_form():
+    status, headers, _ = get({"Accept-Encoding": "gzip", "If-None-Match": f"W/{ETAG}"})
+    assert status == 304
+    assert headers["etag"] == f"W/{ETAG}"
+
+
+def test_strong_validator_still_matches():
+    status, headers, _ = get({"Accept-Encoding": "gzip", "If-None-Match": ETAG})
+    assert status == 304
+    assert headers["etag"] == ETAG
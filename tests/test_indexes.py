@@ -0,0 +1,41 @@
+import pytest
+
+import server
+
+
+def index_keys(collection, name):
+    for index in server.INDEXES[collection]:
+        if index.document["name"] == name:
+            return [field for field, _ in index.document["key"].items()]
+    return None
+
+
+@pytest.mark.parametrize("route, collection, shape, name", server.QUERY_SHAPES)
+def test_query_shapes_name_declared_indexes(route, collection, shape, name):
+    if name is None:
+        # Only whole-collection aggregations may go without an index
+        assert "collection scan" in shape
+    else:
+        assert index_keys(collection, name) is not None
+
+
+@pytest.mark.parametrize("collection, index", [
+    (c, m.document["name"]) for c, models in server.INDEXES.items() for m in models
+    if not m.document.get("unique")  # unique indexes may exist only as constraints
+])
+def test_every_declared_index_serves_a_query_shape(collection, index):
+    assert any(row[1] == collection and row[3] == index for row in server.QUERY_SHAPES)
+
+
+@pytest.mark.parametrize("resource", server.EXPORTS)
+def test_exports_read_in_index_order(resource):
+    # Equality on the owner (when scoped) followed by the date and id sort keys,
+    # so the cursor streams without an in-memory SORT stage
+    collection, _, date_field, owner_field = server.EXPORTS[resource]
+    scopes = [[], [owner_field]] if owner_field else [[]]
+    for equality in scopes:
+        shape = f"{{{', '.join(equality + [date_field + ' range'])}}}"
+        rows = [row for row in server.QUERY_SHAPES
+                if row[0] == f"GET /api/reports/export/{resource}" and row[2].startswith(shape)]
+        assert rows, shape
+        assert index_keys(collection, rows[0][3])[:len(equality) + 2] == equality + [date_field, "id"]
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+import server
+
+
+@pytest.fixture
+def invoice_db(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["jobni_test"]
+    monkeypatch.setattr(server, "db", database)
+    server.invoice_cache.clear()
+
+    async def seed():
+        await database.applications.insert_one({"id": "a1", "job_id": "j1", "applicant_id": "u1", "employer_id": "e1", "status": "accepted"})
+        await database.jobs.insert_one({"id": "j1", "title": "Cashier", "company_name": "Co", "duration_value": "8h", "location": "Riyadh", "salary": 250.0})
+        await database.users.insert_one({"id": "u1", "name": "Worker", "email": "w@example.com"})
+    asyncio.run(seed())
+    return database
+
+
+def request_with(headers=None):
+    raw = [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+
+def employer():
+    return server.User(id="e1", email="e@example.com", name="Employer", role="employer")
+
+
+def test_matching_etag_is_answered_without_rendering(invoice_db, monkeypatch):
+    async def no_render(fields):
+        raise AssertionError("rendered for a conditional request")
+
+    async def scenario():
+        first = await server.generate_invoice("a1", request_with(), employer())
+        server.invoice_cache.clear()  # as on another worker or after a restart
+        monkeypatch.setattr(server, "get_invoice_pdf", no_render)
+        second = await server.generate_invoice("a1", request_with({"If-None-Match": first.headers["etag"]}), employer())
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first.status_code == 200 and first.body.startswith(b"%PDF")
+    assert second.status_code == 304
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_stale_etag_renders_a_fresh_invoice(invoice_db):
+    response = asyncio.run(server.generate_invoice("a1", request_with({"If-None-Match": '"stale"'}), employer()))
+    assert response.status_code == 200
+    assert response.headers["etag"] != '"stale"'
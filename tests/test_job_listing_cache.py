@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+import server
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    server.job_listing_cache.clear()
+    server.job_facet_cache.clear()
+    yield
+    server.job_listing_cache.clear()
+    server.job_facet_cache.clear()
+
+
+def cache_listing(**filters):
+    listing = server.job_listing_filters(
+        filters.get("category"), filters.get("duration_type"), filters.get("location"),
+        None, filters.get("status", "active"), filters.get("employer_id")
+    )
+    key = repr(sorted(filters.items()))
+    server.job_listing_cache.set(key, (listing, b"[]", '"etag"', None), 10)
+    return key
+
+
+def job(**fields):
+    return {"id": "j1", "category": "التجزئة", "duration_type": "hour", "status": "active",
+            "employer_id": "e1", "location": "الرياض", **fields}
+
+
+def test_write_evicts_only_entries_whose_filters_match():
+    retail = cache_listing(category="التجزئة")
+    tech = cache_listing(category="التقنية")
+    server.invalidate_job_listings(job())
+    assert server.job_listing_cache.get(retail) is None
+    assert server.job_listing_cache.get(tech) is not None
+
+
+def test_old_and_new_versions_of_a_job_both_evict():
+    retail = cache_listing(category="التجزئة")
+    tech = cache_listing(category="التقنية")
+    server.invalidate_job_listings(job(), job(category="التقنية"))
+    assert server.job_listing_cache.get(retail) is None
+    assert server.job_listing_cache.get(tech) is None
+
+
+def test_location_patterns_are_evicted_without_being_evaluated():
+    key = cache_listing(location="(a+)+$")
+    started = time.monotonic()
+    server.invalidate_job_listings(job(location="a" * 40 + "!"))
+    assert time.monotonic() - started < 0.5
+    assert server.job_listing_cache.get(key) is None
+
+
+def test_expired_entries_are_misses(monkeypatch):
+    cache = server.ByteLRUCache(100, ttl=30)
+    now = time.monotonic()
+    cache.set("a", "body", 10)
+    monkeypatch.setattr(server.time, "monotonic", lambda: now + 31)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["bytes"]) == (0, 1, 1, 0)
+
+
+def test_expired_entries_release_their_bytes(monkeypatch):
+    cache = server.ByteLRUCache(100, ttl=30)
+    now = time.monotonic()
+    cache.set("old", "body", 60)
+    cache.get("old")
+    monkeypatch.setattr(server.time, "monotonic", lambda: now + 31)
+    cache.set("new", "body", 60)
+    assert list(cache.entries) == ["new"]
+    assert cache.total_bytes == 60
+    assert cache.evictions == 0
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+# Set MONGO_TEST_URL to run the migrations against a real mongod; the server
+# rejects some pipeline updates at parse time, which no in-memory fake checks.
+MONGO_TEST_URL = os.environ.get('MONGO_TEST_URL')
+
+
+def bare_empty_objects(value, path="$"):
+    # Inside an update pipeline a literal {} is a parse error unless wrapped in $literal
+    if isinstance(value, dict):
+        if not value:
+            return [path]
+        found = []
+        for key, item in value.items():
+            if key != "$literal":
+                found += bare_empty_objects(item, f"{path}.{key}")
+        return found
+    if isinstance(value, list):
+        return [p for index, item in enumerate(value) for p in bare_empty_objects(item, f"{path}[{index}]")]
+    return []
+
+
+class RecordingCollection:
+    def __init__(self, collection, calls):
+        self.collection = collection
+        self.calls = calls
+
+    async def update_many(self, query, update, **kwargs):
+        self.calls.append(update)
+        return await self.collection.update_many(query, update, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+class RecordingDatabase:
+    def __init__(self, database):
+        self.database = database
+        self.calls = []
+
+    def __getattr__(self, name):
+        return RecordingCollection(getattr(self.database, name), self.calls)
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = RecordingDatabase(mongomock_motor.AsyncMongoMockClient()["jobni_test"])
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.mark.parametrize("version", [version for version, _, _ in server.MIGRATIONS])
+def test_migration_pipelines_have_no_bare_empty_objects(mock_db, version):
+    migration = next(apply for v, _, apply in server.MIGRATIONS if v == version)
+    asyncio.run(migration())
+    for update in mock_db.calls:
+        if isinstance(update, list):
+            assert bare_empty_objects(update) == []
+
+
+def test_rating_backfill_seeds_from_stored_average(mock_db):
+    async def scenario():
+        await mock_db.users.insert_one({"id": "u1", "rating": 4.0, "total_ratings": 2})
+        await server.rebuild_rating_aggregates()
+        return await mock_db.users.find_one({"id": "u1"}, {"_id": 0})
+
+    user = asyncio.run(scenario())
+    assert user["rating_sum"] == 8.0
+    assert user["rating_distribution"] == {}
+
+
+@pytest.mark.skipif(not MONGO_TEST_URL, reason="MONGO_TEST_URL not set")
+def test_rating_backfill_runs_against_mongod(monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(MONGO_TEST_URL)
+        database = client[f"jobni_migrations_{uuid.uuid4().hex[:8]}"]
+        monkeypatch.setattr(server, "db", database)
+        try:
+            await database.users.insert_one({"id": "u1", "rating": 4.0, "total_ratings": 2})
+            await server.rebuild_rating_aggregates()
+            return await database.users.find_one({"id": "u1"}, {"_id": 0})
+        finally:
+            await client.drop_database(database.name)
+            client.close()
+
+    user = asyncio.run(scenario())
+    assert user["rating_sum"] == 8.0
+    assert user["rating_distribution"] == {}
+
+
+def test_conversation_backfill_defaults_activity_without_messages(mock_db):
+    async def scenario():
+        await mock_db.conversations.insert_one({"id": "c1", "created_at": "2024-01-01T00:00:00+00:00"})
+        await server.backfill_conversation_summaries()
+        return await mock_db.conversations.find_one({"id": "c1"}, {"_id": 0})
+
+    conversation = asyncio.run(scenario())
+    assert conversation["last_activity_at"] == "2024-01-01T00:00:00+00:00"
+    assert conversation["unread"] == {}
+
+
+def lock_expiry(lock):
+    expiry = lock["locked_until"]
+    return expiry if expiry.tzinfo else expiry.replace(tzinfo=timezone.utc)
+
+
+def test_lease_is_renewed_while_a_migration_outlasts_it(mock_db, monkeypatch):
+    monkeypatch.setattr(server, "MIGRATION_LOCK_TTL", timedelta(seconds=0.3))
+    monkeypatch.setattr(server, "INDEXES", {})
+    held = []
+
+    async def slow_migration():
+        for _ in range(4):
+            await asyncio.sleep(0.25)
+            lock = await mock_db.schema_migrations.find_one({"_id": server.MIGRATION_LOCK_ID})
+            held.append(lock_expiry(lock) > datetime.now(timezone.utc))
+
+    monkeypatch.setattr(server, "MIGRATIONS", [(1, "slow", slow_migration)])
+    asyncio.run(server.run_migrations())
+    assert held == [True] * 4
+
+
+def test_lost_lock_stops_before_the_next_migration(mock_db, monkeypatch):
+    monkeypatch.setattr(server, "INDEXES", {})
+    applied = []
+
+    async def first():
+        applied.append(1)
+        # Another worker takes over the (expired) lease while this migration runs
+        await mock_db.schema_migrations.update_one(
+            {"_id": server.MIGRATION_LOCK_ID},
+            {"$set": {"owner": "other", "locked_until": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+
+    async def second():
+        lock = await mock_db.schema_migrations.find_one({"_id": server.MIGRATION_LOCK_ID})
+        applied.append((2, lock["owner"]))
+
+    monkeypatch.setattr(server, "MIGRATIONS", [(1, "first", first), (2, "second", second)])
+    asyncio.run(server.run_migrations())
+    state = asyncio.run(mock_db.schema_migrations.find_one({"_id": server.MIGRATION_STATE_ID}))
+    # The second migration only ran after this worker took the lock back, and the first was not repeated
+    assert applied == [1, (2, server.WORKER_ID)]
+    assert state["version"] == 2
+
+
+@pytest.mark.skipif(not MONGO_TEST_URL, reason="MONGO_TEST_URL not set")
+def test_all_migrations_run_against_mongod(monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(MONGO_TEST_URL)
+        database = client[f"jobni_migrations_{uuid.uuid4().hex[:8]}"]
+        monkeypatch.setattr(server, "db", database)
+        try:
+            await database.users.insert_one({"id": "u1", "email": "u1@example.com", "rating": 4.0, "total_ratings": 2})
+            await database.conversations.insert_one({"id": "c1", "created_at": "2024-01-01T00:00:00+00:00"})
+            await server.run_migrations()
+            conversation = await database.conversations.find_one({"id": "c1"}, {"_id": 0})
+            state = await database.schema_migrations.find_one({"_id": server.MIGRATION_STATE_ID})
+            return conversation, state
+        finally:
+            await client.drop_database(database.name)
+            client.close()
+
+    conversation, state = asyncio.run(scenario())
+    assert conversation["unread"] == {}
+    assert state["version"] == server.MIGRATIONS[-1][0]
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+import server
+
+
+@pytest.fixture
+def mock_db(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["jobni_test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+def enqueue(database, events):
+    asyncio.run(database.outbox.insert_many([dict(event) for event in events]))
+
+
+def outbox_state(database):
+    async def read():
+        return {e["id"]: e async for e in database.outbox.find({}, {"_id": 0})}
+    return asyncio.run(read())
+
+
+def test_a_poison_event_does_not_fail_the_rest_of_its_group(mock_db, monkeypatch):
+    applied = []
+
+    async def handler(events):
+        if any(event["payload"].get("poison") for event in events):
+            raise ValueError("bad payload")
+        applied.extend(event["id"] for event in events)
+        return {}
+
+    monkeypatch.setitem(server.OUTBOX_HANDLERS, "test", handler)
+    events = [server.outbox_event("test", {"poison": i == 3}) for i in range(8)]
+    enqueue(mock_db, events)
+
+    assert asyncio.run(server.process_outbox_batch()) == 8
+    remaining = outbox_state(mock_db)
+    assert list(remaining) == [events[3]["id"]]
+    assert remaining[events[3]["id"]]["status"] == "pending"
+    assert remaining[events[3]["id"]]["attempts"] == 1
+    assert remaining[events[3]["id"]]["last_error"] == "bad payload"
+    assert sorted(applied) == sorted(e["id"] for i, e in enumerate(events) if i != 3)
+
+
+def test_write_errors_fail_only_the_reported_events(mock_db, monkeypatch):
+    async def handler(events):
+        return {1: "document failed validation"}
+
+    monkeypatch.setitem(server.OUTBOX_HANDLERS, "test", handler)
+    events = [server.outbox_event("test", {}) for _ in range(3)]
+    enqueue(mock_db, events)
+
+    asyncio.run(server.process_outbox_batch())
+    remaining = outbox_state(mock_db)
+    assert list(remaining) == [events[1]["id"]]
+    assert remaining[events[1]["id"]]["last_error"] == "document failed validation"
+
+
+def test_insert_ignoring_duplicates_reports_other_errors_by_index():
+    class FailingCollection:
+        async def insert_many(self, docs, ordered):
+            raise BulkWriteError({"writeErrors": [
+                {"index": 0, "code": 11000, "errmsg": "duplicate key"},
+                {"index": 2, "code": 121, "errmsg": "document failed validation"},
+            ]})
+
+    failed = asyncio.run(server.insert_ignoring_duplicates(FailingCollection(), [{}, {}, {}]))
+    assert failed == {2: "document failed validation"}
+
+
+def test_notifications_are_applied_once_across_retries(mock_db):
+    events = [server.notification_event("u1", "new_application", "hello") for _ in range(2)]
+
+    async def scenario():
+        await server.pubsub.start()
+        await mock_db.notifications.create_index("id", unique=True)
+        assert await server.apply_notification_events(events) == {}
+        assert await server.apply_notification_events(events) == {}
+        return await mock_db.notifications.count_documents({})
+
+    assert asyncio.run(scenario()) == 2
+
+
+def seed_application(database):
+    job = {"id": "j1", "title": "كاشير", "employer_id": "e1"}
+    asyncio.run(database.jobs.insert_one(dict(job)))
+    seeker = server.User(id="s1", email="s1@example.com", name="Sara", role="job_seeker")
+    application = asyncio.run(server.create_application(server.ApplicationCreate(job_id="j1"), seeker))
+    return application
+
+
+def test_application_is_stored_with_its_event_in_one_write(mock_db):
+    application = seed_application(mock_db)
+    stored = asyncio.run(mock_db.applications.find_one({"id": application.id}))
+    assert [event["type"] for event in stored["outbox"]] == ["notification"]
+    assert stored["outbox"][0]["payload"]["user_id"] == "e1"
+    assert outbox_state(mock_db) == {}
+
+
+def test_accepting_pushes_the_welcome_event_with_the_status(mock_db):
+    application = seed_application(mock_db)
+    employer = server.User(id="e1", email="e1@example.com", name="Store", role="employer")
+    asyncio.run(server.update_application_status(application.id, server.UpdateApplicationStatus(status="accepted"), employer))
+    stored = asyncio.run(mock_db.applications.find_one({"id": application.id}))
+    assert stored["status"] == "accepted"
+    assert [event["type"] for event in stored["outbox"]] == ["notification", "notification", "conversation_welcome"]
+
+
+def test_relay_moves_embedded_events_into_the_outbox(mock_db):
+    application = seed_application(mock_db)
+    event_id = asyncio.run(mock_db.applications.find_one({"id": application.id}))["outbox"][0]["id"]
+
+    async def scenario():
+        await mock_db.outbox.create_index("id", unique=True)
+        first = await server.relay_outbox_events()
+        # Relaying again (e.g. after a crash before the pull) finds nothing left to copy
+        second = await server.relay_outbox_events()
+        return first, second
+
+    assert asyncio.run(scenario()) == (1, 0)
+    assert list(outbox_state(mock_db)) == [event_id]
+    assert asyncio.run(mock_db.applications.find_one({"id": application.id}))["outbox"] == []
+
+
+def test_relay_keeps_events_that_could_not_be_copied(mock_db, monkeypatch):
+    application = seed_application(mock_db)
+
+    async def failing_insert(collection, docs):
+        return {0: "document failed validation"}
+
+    monkeypatch.setattr(server, "insert_ignoring_duplicates", failing_insert)
+    assert asyncio.run(server.relay_outbox_events()) == 0
+    assert len(asyncio.run(mock_db.applications.find_one({"id": application.id}))["outbox"]) == 1
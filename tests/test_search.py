@@ -0,0 +1,206 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+import server
+
+
+def make_index(*jobs):
+    index = server.JobSearchIndex()
+    for job in jobs:
+        index.add(job)
+    return index
+
+
+def hit_ids(index, query):
+    return [job_id for job_id, _ in index.search(query)]
+
+
+def test_normalization_folds_diacritics_and_letter_variants():
+    assert server.normalize_arabic("مُبَرْمِج") == "مبرمج"
+    assert server.normalize_arabic("أإآا") == "اااا"
+    assert server.normalize_arabic("مدرسة") == "مدرسه"
+    assert server.normalize_arabic("مستشفى") == "مستشفي"
+    assert server.normalize_arabic("٢٠٢٤") == "2024"
+
+
+@pytest.mark.parametrize("word", ["كاشير", "الكاشير", "والكاشير", "بالكاشير", "فالكاشير", "للكاشير"])
+def test_article_and_proclitic_variants_share_a_stem(word):
+    assert server.analyze(word) == server.analyze("كاشير")
+
+
+@pytest.mark.parametrize("word", ["كاشير", "وظيفة", "فندق", "بائع", "لحام"])
+def test_leading_letters_that_look_like_proclitics_are_kept(word):
+    # و ب ف ك ل alone are usually part of the word, not a prefix
+    assert server.analyze(word)[0][0] == server.normalize_arabic(word)[0]
+
+
+def test_suffixes_are_stripped_but_short_roots_kept():
+    assert server.analyze("السائقين") == server.analyze("سائق")
+    assert server.analyze("وظيفة") == server.analyze("الوظيفة")
+    assert server.analyze("ها") == ["ها"]
+
+
+@pytest.mark.parametrize("query", ["كاشير", "الكاشير", "والكاشير"])
+def test_search_matches_article_variants_of_a_title(query):
+    index = make_index({"id": "j1", "title": "كاشير", "company_name": "", "description": ""})
+    assert hit_ids(index, query) == ["j1"]
+
+
+def test_title_matches_rank_above_description_matches():
+    index = make_index(
+        {"id": "desc", "title": "موظف مبيعات", "company_name": "متجر", "description": "يساعد الكاشير عند الازدحام"},
+        {"id": "title", "title": "كاشير", "company_name": "متجر", "description": "العمل في فرع الرياض"},
+    )
+    assert hit_ids(index, "كاشير") == ["title", "desc"]
+
+
+def test_all_query_terms_must_match():
+    index = make_index(
+        {"id": "both", "title": "كاشير في الرياض", "company_name": "", "description": ""},
+        {"id": "one", "title": "كاشير في جدة", "company_name": "", "description": ""},
+    )
+    assert hit_ids(index, "كاشير الرياض") == ["both"]
+
+
+def test_last_token_is_expanded_as_a_prefix():
+    index = make_index(
+        {"id": "j1", "title": "كاشير", "company_name": "", "description": ""},
+        {"id": "j2", "title": "سائق", "company_name": "", "description": ""},
+    )
+    assert hit_ids(index, "كاش") == ["j1"]
+    assert index.expand_prefix("كاش") == ["كاشير"]
+
+
+def test_prefix_expansion_applies_only_to_the_last_token():
+    index = make_index({"id": "j1", "title": "كاشير الرياض", "company_name": "", "description": ""})
+    assert hit_ids(index, "الرياض كاش") == ["j1"]
+    assert hit_ids(index, "كاش الرياض") == []
+
+
+def test_exact_term_outranks_prefix_expansion():
+    index = make_index(
+        {"id": "prefix", "title": "javascript", "company_name": "", "description": ""},
+        {"id": "exact", "title": "java", "company_name": "", "description": ""},
+    )
+    assert hit_ids(index, "java") == ["exact", "prefix"]
+
+
+def test_removed_jobs_leave_no_postings():
+    index = make_index({"id": "j1", "title": "كاشير", "company_name": "", "description": ""})
+    index.remove("j1")
+    assert hit_ids(index, "كاشير") == []
+    assert index.vocabulary == []
+
+
+def test_highlight_marks_article_variants():
+    assert server.highlight("مطلوب الكاشير", "كاشير") == "مطلوب <mark>الكاشير</mark>"
+
+
+def test_search_jobs_finds_article_variant_through_the_database(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["jobni_test"]
+    job = {
+        "id": "j1", "title": "كاشير", "description": "وصف", "company_name": "متجر", "location": "الرياض",
+        "duration_type": "hour", "duration_value": "1", "salary": 100.0, "category": "التجزئة",
+        "employer_id": "e1", "status": "active"
+    }
+    index = make_index(job)
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "job_search_index", index)
+
+    async def scenario():
+        await database.jobs.insert_one(dict(job))
+        return await server.search_jobs({"status": "active"}, "الكاشير", None, 20, Response())
+
+    assert [found["id"] for found in asyncio.run(scenario())] == ["j1"]
+
+
+def test_filters_are_applied_before_the_result_cap():
+    index = make_index(
+        *({"id": f"closed{i}", "title": "كاشير", "status": "closed"} for i in range(5)),
+        {"id": "open", "title": "مساعد", "description": "يساعد الكاشير", "status": "active"},
+    )
+    assert [job_id for job_id, _ in index.search("كاشير", limit=1, filters={"status": "active"})] == ["open"]
+    assert len(index.search("كاشير", limit=None)) == 6
+
+
+def closed_and_active_jobs():
+    # 1200 closed jobs outrank the 5 active ones for "كاشير"
+    base = {
+        "company_name": "متجر", "location": "الرياض", "duration_type": "hour", "duration_value": "1",
+        "salary": 100.0, "category": "التجزئة", "employer_id": "e1"
+    }
+    jobs = [{**base, "id": f"closed{i:04}", "title": "كاشير", "description": "", "status": "closed"} for i in range(1200)]
+    jobs += [{**base, "id": f"open{i}", "title": "مساعد", "description": "يساعد الكاشير", "status": "active"} for i in range(5)]
+    return jobs
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    database = mongomock_motor.AsyncMongoMockClient()["jobni_test"]
+    jobs = closed_and_active_jobs()
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "job_search_index", make_index(*jobs))
+    asyncio.run(database.jobs.insert_many([dict(job) for job in jobs]))
+    return database
+
+
+def test_closed_jobs_do_not_hide_active_matches(catalog):
+    found = asyncio.run(server.search_jobs({"status": "active"}, "كاشير", None, 20, Response()))
+    assert sorted(job["id"] for job in found) == [f"open{i}" for i in range(5)]
+
+
+def test_search_facets_count_every_active_match(catalog):
+    facets = asyncio.run(server.query_job_facets(None, None, None, "كاشير", "active", None, None))
+    assert facets["total"] == 5
+    assert facets["category"] == [{"value": "التجزئة", "count": 5}]
+
+
+class ScanningJobs:
+    # Stands in for db.jobs; runs a "concurrent" write after the first job is read
+    def __init__(self, jobs, during_scan):
+        self.jobs = jobs
+        self.during_scan = during_scan
+
+    def find(self, query, projection):
+        return self.scan()
+
+    async def scan(self):
+        for position, job in enumerate(self.jobs):
+            if position == 1:
+                self.during_scan()
+            yield dict(job)
+
+
+def test_writes_during_a_rebuild_survive_the_swap(monkeypatch):
+    jobs = [{"id": "edited", "title": "كاشير", "status": "active"}, {"id": "deleted", "title": "سائق", "status": "active"}]
+
+    def write():
+        server.index_job({"id": "edited", "title": "محاسب", "status": "active"})
+        server.unindex_job("deleted")
+
+    monkeypatch.setattr(server, "db", type("Database", (), {"jobs": ScanningJobs(jobs, write)})())
+    monkeypatch.setattr(server, "job_search_index", server.JobSearchIndex())
+    asyncio.run(server.rebuild_search_index())
+    assert hit_ids(server.job_search_index, "محاسب") == ["edited"]
+    assert hit_ids(server.job_search_index, "كاشير") == []
+    assert hit_ids(server.job_search_index, "سائق") == []
+    assert server.job_index_journals == []
+
+
+def test_writes_during_a_rebuild_reach_the_recommender(monkeypatch):
+    jobs = [{"id": "closed", "title": "كاشير", "requirements": ["كاشير"], "status": "active"},
+            {"id": "other", "title": "سائق", "requirements": ["قيادة"], "status": "active"}]
+
+    def write():
+        server.index_job({"id": "closed", "title": "كاشير", "requirements": ["كاشير"], "status": "closed"})
+        server.index_job({"id": "new", "title": "محاسب", "requirements": ["محاسبة"], "status": "active"})
+
+    monkeypatch.setattr(server, "db", type("Database", (), {"jobs": ScanningJobs(jobs, write)})())
+    monkeypatch.setattr(server, "job_search_index", server.JobSearchIndex())
+    monkeypatch.setattr(server, "job_recommender", server.JobRecommender())
+    asyncio.run(server.rebuild_recommender())
+    assert sorted(server.job_recommender.rows) == ["new", "other"]